@@ -0,0 +1,435 @@
+import sys
+import time
+from collections import deque
+import numpy as np
+from typing import Any, Dict, List, Optional, Tuple
+from dataInput import TransactionFrame
+from anomalyDetector import AnomalyDetector
+
+# Vectorized versions of the analyses generate_financial_insights used to define inline.
+# Everything works on one TransactionFrame with integer-cent costs and returns the same
+# algorithm_results structure. As before, anomalies index the transactions in their
+# original order and every other index refers to the date-ordered list.
+
+
+def _label(frame: TransactionFrame, i: int) -> str:
+    return f"{int(frame.purchaseYear[i])}-{int(frame.purchaseMonth[i])}-{int(frame.purchaseDay[i])}"
+
+
+def detect_anomalies(frame: TransactionFrame, detector: Optional[AnomalyDetector] = None) -> List[Dict[str, Any]]:
+    """
+    Feed the transactions to an online AnomalyDetector in date order, so each one is judged
+    against the spending before it. Pass a detector restored from saved state to continue
+    from earlier history; it is updated in place.
+    """
+    detector = AnomalyDetector() if detector is None else detector
+    order = frame.dateOrder()
+    columns = zip(
+        order.tolist(), frame.cost[order].tolist(), frame.purchaseYear[order].tolist(),
+        frame.purchaseMonth[order].tolist(), frame.purchaseDay[order].tolist()
+    )
+    anomalies = []
+    for i, cost, year, month, day in columns:
+        anomaly = detector.update(cost, year, month, day, index=i)
+        if anomaly is not None:
+            anomalies.append(anomaly)
+    anomalies.sort(key=lambda anomaly: anomaly["transaction_index"])
+    return anomalies
+
+
+def greedy_debt_plan(unpaid: TransactionFrame) -> List[Dict[str, Any]]:
+    """
+    Pay the largest unpaid purchases first from a budget of half the unpaid total: a prefix
+    of full payments, then one partial payment with whatever is left.
+    """
+    costs = unpaid.costCents
+    if len(costs) == 0:
+        return []
+    order = np.argsort(-costs, kind="stable")
+    ordered = costs[order]
+    funds = int(costs.sum()) * 0.5
+    paid_through = np.cumsum(ordered)
+    full = int(np.searchsorted(paid_through, funds, side="right"))
+
+    plan = [
+        {"amount": int(ordered[k]) / 100, "date": _label(unpaid, order[k]), "action": "pay_full"}
+        for k in range(full)
+    ]
+    remaining = funds - (int(paid_through[full - 1]) if full else 0)
+    if full < len(ordered) and remaining > 0:
+        plan.append({
+            "amount": remaining / 100,
+            "date": _label(unpaid, order[full]),
+            "action": "pay_partial",
+            "remaining": (int(ordered[full]) - remaining) / 100
+        })
+        # Nothing is left after a partial payment: zero-cost purchases right after it still
+        # "fit", and the first positive one ends the plan
+        for k in range(full + 1, len(ordered)):
+            if ordered[k] != 0:
+                break
+            plan.append({"amount": 0.0, "date": _label(unpaid, order[k]), "action": "pay_full"})
+    return plan
+
+
+def recursive_trend(costs: np.ndarray, start: int = 0, end: Optional[int] = None, depth: int = 0, max_depth: int = 3) -> Dict[str, Any]:
+    """Halve the date-ordered costs up to `max_depth` times and compare the halves' trends."""
+    end = len(costs) if end is None else end
+    if depth >= max_depth or end - start < 2:
+        return {"trend": "insufficient_data", "depth": depth}
+    if end - start == 2:
+        diff = costs[start + 1] - costs[start]
+        return {"trend": "increasing" if diff > 0 else "decreasing" if diff < 0 else "stable", "depth": depth}
+    mid = start + (end - start) // 2
+    left = recursive_trend(costs, start, mid, depth + 1, max_depth)
+    right = recursive_trend(costs, mid, end, depth + 1, max_depth)
+    if left["trend"] == right["trend"]:
+        return {"trend": left["trend"], "depth": depth, "consistency": "high"}
+    return {"trend": "mixed", "depth": depth, "left": left["trend"], "right": right["trend"]}
+
+
+# Bits the payment scheduler may keep for reconstructing its choice (2 MB); above this it
+# switches from the exact solver to the scaled approximation
+SCHEDULER_BIT_CAP = 1 << 24
+# Longest min-weight table the approximation allocates (1 MB of int64)
+SCHEDULER_MAX_STATES = 1 << 17
+
+
+def _schedule_exact(weights: List[int], budget: int) -> List[int]:
+    """
+    Subset sum as a Python-int bitset: bit k of `reach` means k cents can be paid exactly.
+    The bitset before each item is kept, so walking items last to first recovers which of
+    them build the largest reachable total.
+    """
+    mask = (1 << (budget + 1)) - 1
+    reach = 1
+    snapshots = []
+    for weight in weights:
+        snapshots.append(reach)
+        reach |= (reach << weight) & mask
+    total = reach.bit_length() - 1
+    chosen = []
+    for i in range(len(weights) - 1, -1, -1):
+        if not (snapshots[i] >> total) & 1:
+            chosen.append(i)
+            total -= weights[i]
+    return chosen
+
+
+def _schedule_approximate(weights: List[int], budget: int, unit: int) -> List[int]:
+    """
+    Knapsack FPTAS: amounts are scored in whole `unit`s (rounded down) while the budget is
+    checked on exact cents, with dp[k] the least money that scores k units. Rounding costs
+    each chosen debt less than one unit, so the result is within (debts paid) * unit cents
+    of the best possible schedule and never exceeds the budget.
+    """
+    states = budget // unit + 1
+    unreachable = np.iinfo(np.int64).max
+    dp = np.full(states, unreachable, dtype=np.int64)
+    dp[0] = 0
+    improved = []
+    for weight in weights:
+        value = weight // unit
+        if value == 0:
+            improved.append(None)
+            continue
+        candidate = dp[:-value] + weight
+        better = (candidate < dp[value:]) & (candidate <= budget) & (dp[:-value] != unreachable)
+        dp[value:] = np.where(better, candidate, dp[value:])
+        improved.append(np.packbits(better))
+
+    score = int(np.flatnonzero(dp != unreachable)[-1])
+    chosen = []
+    for i in range(len(weights) - 1, -1, -1):
+        value = weights[i] // unit
+        if improved[i] is None or score < value:
+            continue
+        offset = score - value
+        if (improved[i][offset >> 3] >> (7 - (offset & 7))) & 1:
+            chosen.append(i)
+            score -= value
+    return chosen
+
+
+def optimal_payment_schedule(unpaid: TransactionFrame, monthly_budget_cents: int, bit_cap: int = SCHEDULER_BIT_CAP) -> Tuple[List[Dict[str, Any]], str, float]:
+    """
+    Choose unpaid debts that fill as much of the monthly budget as possible, in cents. Runs
+    exactly while debts * budget stays under `bit_cap` bits, otherwise approximately with a
+    unit sized to keep memory bounded. Returns the schedule, the solver mode and the most
+    the schedule can fall short of the optimum, in dollars (0 when exact).
+    """
+    eligible = [i for i, cents in enumerate(unpaid.costCents.tolist()) if 0 < cents <= monthly_budget_cents]
+    if not eligible:
+        return [], "exact", 0.0
+    weights = [int(unpaid.costCents[i]) for i in eligible]
+    budget = monthly_budget_cents
+
+    if len(weights) * (budget + 1) <= bit_cap:
+        mode, shortfall = "exact", 0
+        chosen = _schedule_exact(weights, budget)
+    else:
+        unit = max(-(-len(weights) * (budget + 1) // bit_cap), -(-(budget + 1) // SCHEDULER_MAX_STATES))
+        mode, shortfall = "approximate", unit * min(len(weights), budget // min(weights))
+        chosen = _schedule_approximate(weights, budget, unit)
+
+    schedule = [
+        {"debt_index": eligible[i], "amount": weights[i] / 100, "month": month}
+        for month, i in enumerate(chosen, start=1)
+    ]
+    return schedule, mode, shortfall / 100
+
+
+def day_ordinals(frame: TransactionFrame) -> np.ndarray:
+    """Days since 1970-01-01 for each purchase; out-of-range days roll into the next month."""
+    months = (frame.purchaseYear.astype(np.int64) - 1970) * 12 + frame.purchaseMonth - 1
+    first_of_month = months.astype("datetime64[M]").astype("datetime64[D]").astype(np.int64)
+    return first_of_month + frame.purchaseDay - 1
+
+
+def spending_clusters(frame: TransactionFrame, max_days: int = 7, max_cost_cents: int = 5000) -> List[List[int]]:
+    """
+    Groups of purchases connected by links of at most `max_days` calendar days and $50
+    apart. Purchases are swept in date order with costs bucketed by `max_cost_cents`: two
+    purchases in the same bucket within the window always link, so each one only joins the
+    latest of its own bucket, and the neighbouring buckets are checked against their window
+    min/max kept in monotonic deques. Components come from a union-find, so the whole pass
+    is O(n log n) with no recursion. Clusters are sorted index lists, ordered by first index.
+    """
+    n = len(frame)
+    if n < 2:
+        return []
+    ordinals = day_ordinals(frame).tolist()
+    costs = frame.costCents.tolist()
+    parent = list(range(n))
+    size = [1] * n
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i, j):
+        i, j = find(i), find(j)
+        if i != j:
+            if size[i] < size[j]:
+                i, j = j, i
+            parent[j] = i
+            size[i] += size[j]
+
+    latest = {}
+    window_min = {}
+    window_max = {}
+    for i in sorted(range(n), key=ordinals.__getitem__):
+        day, cost = ordinals[i], costs[i]
+        bucket = cost // max_cost_cents
+        oldest = day - max_days
+
+        previous = latest.get(bucket)
+        if previous is not None and ordinals[previous] >= oldest:
+            union(i, previous)
+        for neighbour, window, reachable in (
+            (bucket + 1, window_min, lambda j: costs[j] - cost <= max_cost_cents),
+            (bucket - 1, window_max, lambda j: cost - costs[j] <= max_cost_cents),
+        ):
+            queue = window.get(neighbour)
+            if queue is None:
+                continue
+            while queue and ordinals[queue[0]] < oldest:
+                queue.popleft()
+            if queue and reachable(queue[0]):
+                union(i, queue[0])
+
+        latest[bucket] = i
+        low = window_min.setdefault(bucket, deque())
+        while low and costs[low[-1]] >= cost:
+            low.pop()
+        low.append(i)
+        high = window_max.setdefault(bucket, deque())
+        while high and costs[high[-1]] <= cost:
+            high.pop()
+        high.append(i)
+
+    groups = {}
+    for i in range(n):
+        groups.setdefault(find(i), []).append(i)
+    return [group for group in groups.values() if len(group) > 1]
+
+
+def sliding_window_trend(costs: np.ndarray, window_size: int = 5) -> Dict[str, Any]:
+    if len(costs) < window_size:
+        return {"trend": "insufficient_data"}
+    slopes = (costs[window_size - 1:] - costs[:len(costs) - window_size + 1]) / window_size
+    avg_slope = float(slopes.mean())
+    return {
+        "trend": "increasing" if avg_slope > 0.1 else "decreasing" if avg_slope < -0.1 else "stable",
+        "avg_slope": avg_slope,
+        "window_size": window_size
+    }
+
+
+def top_priority_debts(unpaid: TransactionFrame, count: int = 3) -> List[Dict[str, Any]]:
+    """Highest cost*0.8 + mid-month proximity*0.2 first; ties go to the earlier debt."""
+    costs = unpaid.cost
+    priorities = costs * 0.8 + (30 - np.abs(unpaid.purchaseDay - 15)) * 0.2
+    order = np.lexsort((np.arange(len(priorities)), -priorities))[:count]
+    return [{"index": int(i), "priority": float(priorities[i]), "amount": float(costs[i])} for i in order]
+
+
+def budget_allocation(categories: List[Dict[str, Any]], budget: int, step: int = 50) -> Tuple[Optional[List[Dict[str, Any]]], float]:
+    """
+    Split `budget` into `step`-dollar amounts, each category capped at its "max", to maximise
+    the sum of score * amount / max. Every step costs the same and earns a fixed score in its
+    category, so filling categories in order of score per step is optimal: O(k log k) for k
+    categories. Among equally good allocations the one the exhaustive search used to find
+    first (lexicographically smallest amounts) is returned; (None, 0) if nothing scores.
+    """
+    if not categories or budget < 0:
+        return None, 0
+    step_values = [c["score"] * step / c["max"] if c["max"] > 0 else 0 for c in categories]
+    amounts = [0] * len(categories)
+    steps_left = budget // step
+    for i in sorted(range(len(categories)), key=lambda i: (-step_values[i], -i)):
+        if step_values[i] <= 0 or steps_left == 0:
+            break
+        steps = min(categories[i]["max"] // step, steps_left)
+        amounts[i] = steps * step
+        steps_left -= steps
+
+    allocation = [
+        {"name": c["name"], "amount": amount, "score": c["score"] * (amount / c["max"]) if c["max"] else 0.0}
+        for c, amount in zip(categories, amounts)
+    ]
+    total = sum(a["score"] for a in allocation)
+    if total <= 0:
+        return None, 0
+    return allocation, total
+
+
+def divide_conquer(costs_cents: np.ndarray, threshold: int = 10) -> Dict[str, Any]:
+    """The recursive halving summary, with every node's total read off one prefix-sum array."""
+    prefix = np.concatenate(([0], np.cumsum(costs_cents)))
+
+    def node(start, end):
+        count = end - start
+        if count <= threshold:
+            total = int(prefix[end] - prefix[start]) / 100 if count else 0
+            return {"total_amount": total, "avg_amount": total / count if count else 0, "count": count}
+        mid = start + count // 2
+        left, right = node(start, mid), node(mid, end)
+        return {
+            "total_amount": left["total_amount"] + right["total_amount"],
+            "avg_amount": (left["avg_amount"] + right["avg_amount"]) / 2,
+            "count": count,
+            "left": left,
+            "right": right
+        }
+
+    return node(0, len(costs_cents))
+
+
+def two_pointer_matches(sorted_cents: List[int], target_cents: float) -> List[Dict[str, Any]]:
+    """Pairs from the amount-sorted costs summing exactly to the target, compared in cents."""
+    left, right = 0, len(sorted_cents) - 1
+    matches = []
+    while left < right:
+        current = sorted_cents[left] + sorted_cents[right]
+        if current == target_cents:
+            matches.append({
+                "left_index": left,
+                "right_index": right,
+                "left_amount": sorted_cents[left] / 100,
+                "right_amount": sorted_cents[right] / 100,
+                "sum": current / 100
+            })
+            left += 1
+            right -= 1
+        elif current < target_cents:
+            left += 1
+        else:
+            right -= 1
+    return matches
+
+
+def analyze(frame: TransactionFrame, card_limit: float) -> Dict[str, Any]:
+    """All algorithm_results for one card; `frame` is in the order the purchases were listed."""
+    n = len(frame)
+    by_date = frame.take(frame.dateOrder())
+    unpaid = by_date.take(np.flatnonzero(by_date.unpaid))
+    by_amount = np.sort(frame.costCents, kind="stable")
+
+    monthly_budget = card_limit * 0.3
+    budget_categories = [
+        {"name": "essential", "max": int(monthly_budget * 0.6), "score": 10},
+        {"name": "debt_payment", "max": int(monthly_budget * 0.3), "score": 8},
+        {"name": "savings", "max": int(monthly_budget * 0.1), "score": 6}
+    ]
+    optimal_budget, budget_score = budget_allocation(budget_categories, int(monthly_budget))
+    optimal_schedule, solver_mode, max_shortfall = optimal_payment_schedule(unpaid, int(monthly_budget * 100 + 1e-6))
+    clusters = spending_clusters(by_date)
+    date_groups = len(np.unique(np.stack([by_date.purchaseYear, by_date.purchaseMonth, by_date.purchaseDay], axis=1), axis=0)) if n else 0
+    top_priorities = top_priority_debts(unpaid)
+    # 10% of the limit in cents; snap float noise so e.g. a $5000 limit targets exactly 50000
+    target_cents = card_limit * 10
+    if abs(target_cents - round(target_cents)) < 1e-6:
+        target_cents = round(target_cents)
+    matches = two_pointer_matches(by_amount.tolist(), target_cents)
+
+    return {
+        "anomalies": detect_anomalies(frame),
+        "sorting_stats": {
+            "quicksort_by_amount": n,
+            "mergesort_by_date": n
+        },
+        "search_results": {
+            "unpaid_count": len(unpaid),
+            "median_amount": int(by_amount[n // 2]) / 100 if n else 0,
+            "median_found": n > 0
+        },
+        "greedy_debt_plan": greedy_debt_plan(unpaid),
+        "recursive_trend": recursive_trend(by_date.costCents),
+        "dynamic_programming": {
+            "optimal_schedule": optimal_schedule,
+            "monthly_budget": monthly_budget,
+            "solver_mode": solver_mode,
+            "max_shortfall": max_shortfall
+        },
+        "graph_analysis": {
+            "spending_clusters": clusters,
+            "cluster_count": len(clusters)
+        },
+        "hash_table": {
+            "date_groups": date_groups,
+            "total_entries": n
+        },
+        "sliding_window": sliding_window_trend(by_date.cost),
+        "heap_priority": {
+            "top_priorities": top_priorities,
+            "priority_count": len(top_priorities)
+        },
+        "backtracking": {
+            "optimal_budget": optimal_budget,
+            "budget_score": budget_score
+        },
+        "divide_conquer": divide_conquer(by_date.costCents),
+        "two_pointers": {
+            "matches": matches,
+            "match_count": len(matches)
+        }
+    }
+
+
+if __name__ == "__main__":
+    # python analytics.py [transactions] [card_limit]: time analyze() on random data
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    limit = float(sys.argv[2]) if len(sys.argv) > 2 else 5000.0
+    rng = np.random.default_rng(0)
+    paid = rng.random(n) < 0.5
+    frame = TransactionFrame(
+        np.full(n, 2024), rng.integers(1, 13, n), rng.integers(1, 29, n),
+        np.where(paid, 2024, -1), np.where(paid, 6, -1), np.where(paid, 1, -1),
+        rng.integers(100, 50000, n)
+    )
+    started = time.perf_counter()
+    results = analyze(frame, limit)
+    print(f"{n} transactions analysed in {time.perf_counter() - started:.3f}s, {results['graph_analysis']['cluster_count']} clusters")
@@ -0,0 +1,153 @@
+import bisect
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+
+class RunningStats:
+    """Welford's online mean and (population) variance."""
+
+    __slots__ = ("count", "mean", "m2")
+
+    def __init__(self, count: int = 0, mean: float = 0.0, m2: float = 0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    @property
+    def std(self) -> float:
+        return (self.m2 / self.count) ** 0.5 if self.count else 0.0
+
+    def z_score(self, value: float) -> Optional[float]:
+        std = self.std
+        return abs(value - self.mean) / std if std > 0 else None
+
+    def to_list(self) -> List[float]:
+        return [self.count, self.mean, self.m2]
+
+
+def _kth_of_two(a: Callable[[int], float], a_len: int, b: Callable[[int], float], b_len: int, k: int) -> float:
+    """k-th smallest (0-based) of two ascending sequences, by binary search on the split."""
+    lo, hi = max(0, k + 1 - b_len), min(k + 1, a_len)
+    while lo < hi:
+        i = (lo + hi) // 2
+        if a(i) < b(k - i):
+            lo = i + 1
+        else:
+            hi = i
+    j = k + 1 - lo
+    return max(a(lo - 1) if lo > 0 else float("-inf"), b(j - 1) if j > 0 else float("-inf"))
+
+
+class AnomalyDetector:
+    """
+    Online spending anomaly detector. Each purchase is scored against the purchases before
+    it, then added to the state, so appending never rescans history:
+
+    - a rolling window of the last `window` costs gives a median/MAD robust z-score
+      (0.6745 * (x - median) / MAD), which one huge purchase can't inflate the way it
+      inflates a plain standard deviation;
+    - Welford running stats, overall and per calendar month, supply the classic z-score,
+      used instead when more than half the window is identical (MAD of 0).
+
+    An update costs O(log window) comparisons plus a sorted-list insert/remove. to_dict()
+    and from_dict() round-trip the full state as JSON-friendly data.
+    """
+
+    def __init__(self, window: int = 50, robust_threshold: float = 3.5, z_threshold: float = 2.5, min_samples: int = 5):
+        self.window = window
+        self.robust_threshold = robust_threshold
+        self.z_threshold = z_threshold
+        self.min_samples = min_samples
+        self.recent: deque = deque()
+        self.sorted_recent: List[float] = []
+        self.overall = RunningStats()
+        self.months: Dict[str, RunningStats] = {}
+
+    def median_mad(self):
+        values = self.sorted_recent
+        n = len(values)
+        if n == 0:
+            return None, None
+        half = n // 2
+        median = values[half] if n % 2 else (values[half - 1] + values[half]) / 2
+        # Deviations below and above the median are each already sorted
+        split = bisect.bisect_left(values, median)
+        below = lambda j: median - values[split - 1 - j]
+        above = lambda j: values[split + j] - median
+        mad = _kth_of_two(below, split, above, n - split, half)
+        if n % 2 == 0:
+            mad = (mad + _kth_of_two(below, split, above, n - split, half - 1)) / 2
+        return median, mad
+
+    def score(self, cost: float, year: int, month: int) -> Optional[Dict[str, Any]]:
+        """How unusual `cost` is given everything seen so far; None until there is enough history."""
+        if len(self.recent) < self.min_samples:
+            return None
+        median, mad = self.median_mad()
+        if mad > 0:
+            method, score = "robust", abs(0.6745 * (cost - median) / mad)
+            anomalous = score > self.robust_threshold
+        else:
+            method, score = "zscore", self.overall.z_score(cost) or 0.0
+            anomalous = score > self.z_threshold
+        month_stats = self.months.get(f"{year}-{month:02d}")
+        return {
+            "method": method,
+            "score": score,
+            "anomalous": anomalous,
+            "month_z_score": month_stats.z_score(cost) if month_stats and month_stats.count >= self.min_samples else None
+        }
+
+    def update(self, cost: float, year: int, month: int, day: int, index: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Score one purchase, add it to the state, and return an anomaly record if it was flagged."""
+        scored = self.score(cost, year, month)
+        self._add(cost, year, month)
+        if scored is None or not scored["anomalous"]:
+            return None
+        return {
+            "transaction_index": index,
+            "amount": cost,
+            "z_score": scored["score"],
+            "date": f"{year}-{month}-{day}",
+            "method": scored["method"],
+            "month_z_score": scored["month_z_score"]
+        }
+
+    def _add(self, cost: float, year: int, month: int) -> None:
+        recent, ordered = self.recent, self.sorted_recent
+        recent.append(cost)
+        bisect.insort(ordered, cost)
+        if len(recent) > self.window:
+            del ordered[bisect.bisect_left(ordered, recent.popleft())]
+        self.overall.add(cost)
+        key = f"{year}-{month:02d}"
+        stats = self.months.get(key)
+        if stats is None:
+            stats = self.months[key] = RunningStats()
+        stats.add(cost)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "window": self.window,
+            "robust_threshold": self.robust_threshold,
+            "z_threshold": self.z_threshold,
+            "min_samples": self.min_samples,
+            "recent": list(self.recent),
+            "overall": self.overall.to_list(),
+            "months": {key: stats.to_list() for key, stats in self.months.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "AnomalyDetector":
+        detector = cls(data["window"], data["robust_threshold"], data["z_threshold"], data["min_samples"])
+        detector.recent = deque(data["recent"])
+        detector.sorted_recent = sorted(data["recent"])
+        detector.overall = RunningStats(*data["overall"])
+        detector.months = {key: RunningStats(*stats) for key, stats in data["months"].items()}
+        return detector
@@ -1,20 +1,32 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Form, File, UploadFile
+from fastapi import FastAPI, Depends, HTTPException, status, Form, File, UploadFile, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.orm import Session, load_only
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from fastapi.concurrency import run_in_threadpool
 import database, models, auth
 import uvicorn
 import os
+import asyncio
 import sys
+import shutil
+import tempfile
+from typing import List, NamedTuple, Optional
 from dotenv import load_dotenv
 load_dotenv()
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from martianAPIWrapper import MartianClient
-from pdfToText import extract_pdf_text
-from dataInput import transactionData, date, cardData
-from criteria import critera
+import pipeline, bulk, incremental, transactions, blobstore, dashboard
+from jobs import JobQueue, QueueFullError
 
 models.Base.metadata.create_all(bind=database.engine)
+# Refuse to start against a database that predates a model change, rather than failing on every query
+missing_columns = database.missing_columns(models.Base.metadata)
+if missing_columns:
+    raise RuntimeError(
+        f"Database schema is out of date, missing columns: {', '.join(missing_columns)}. "
+        "See \"Upgrading an existing database\" in README.md"
+    )
 app = FastAPI()
 
 # Get allowed origins from environment variable, default to localhost for development
@@ -30,655 +42,40 @@ app.add_middleware(
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
-def get_martian_client():
-    api_key = os.getenv("MARTIAN_API_KEY")
-    if not api_key:
-        raise HTTPException(status_code=500, detail="Martian API key not configured")
-    return MartianClient(api_key)
+job_queue = JobQueue(
+    pipeline.ANALYSIS_STAGES,
+    workers=int(os.getenv("ANALYSIS_WORKERS", "4")),
+    max_queued=int(os.getenv("ANALYSIS_QUEUE_SIZE", "1000")),
+)
 
-def detect_anomalies(transactions):
-    if len(transactions) < 3:
-        return []
-    
-    costs = [t.cost for t in transactions]
-    mean_cost = sum(costs) / len(costs)
-    variance = sum((x - mean_cost) ** 2 for x in costs) / len(costs)
-    std_dev = variance ** 0.5
-    
-    anomalies = []
-    for i, transaction in enumerate(transactions):
-        z_score = abs(transaction.cost - mean_cost) / std_dev if std_dev > 0 else 0
-        if z_score > 2.5:
-            anomalies.append({
-                "transaction_index": i,
-                "amount": transaction.cost,
-                "z_score": z_score,
-                "date": f"{transaction.purchaseDate.year}-{transaction.purchaseDate.month}-{transaction.purchaseDate.day}"
-            })
-    
-    return anomalies
+@app.on_event("startup")
+async def warm_martian_client():
+    if not os.getenv("MARTIAN_API_KEY"):
+        return
+    connections = int(os.getenv("MARTIAN_PRECONNECT", "2"))
+    if connections > 0:
+        opened = await pipeline.get_martian_client().preconnect(connections)
+        print(f"Martian client pre-connected {opened}/{connections} connections")
 
-def generate_credit_improvement_plan(financial_metrics, insights, recommendations, risk_assessment, trends, custom_credit_score):
-    try:
-        with open("credit_plan_prompt.txt", "r") as f:
-            plan_prompt = f.read()
-        
-        # Parse all the JSON data
-        import json
-        metrics_data = json.loads(financial_metrics) if financial_metrics else {}
-        insights_data = json.loads(insights) if insights else []
-        recommendations_data = json.loads(recommendations) if recommendations else []
-        risk_data = json.loads(risk_assessment) if risk_assessment else {}
-        trends_data = json.loads(trends) if trends else {}
-        credit_score_data = json.loads(custom_credit_score) if custom_credit_score else {}
-        
-        # Extract algorithm results
-        algorithm_results = credit_score_data.get("algorithm_results", {})
-        
-        comprehensive_data = f"""
-COMPREHENSIVE FINANCIAL ANALYSIS FOR CREDIT IMPROVEMENT PLAN:
-
-FINANCIAL METRICS:
-{json.dumps(metrics_data, indent=2)}
-
-AI INSIGHTS:
-{json.dumps(insights_data, indent=2)}
-
-RECOMMENDATIONS:
-{json.dumps(recommendations_data, indent=2)}
-
-RISK ASSESSMENT:
-{json.dumps(risk_data, indent=2)}
-
-TRENDS ANALYSIS:
-{json.dumps(trends_data, indent=2)}
-
-CUSTOM CREDIT SCORE:
-{json.dumps(credit_score_data, indent=2)}
-
-ALGORITHM ANALYSIS RESULTS:
-Anomaly Detection: {json.dumps(algorithm_results.get("anomalies", []), indent=2)}
-Sorting Analysis: {json.dumps(algorithm_results.get("sorting_stats", {}), indent=2)}
-Search Results: {json.dumps(algorithm_results.get("search_results", {}), indent=2)}
-Greedy Debt Plan: {json.dumps(algorithm_results.get("greedy_debt_plan", []), indent=2)}
-Recursive Trend: {json.dumps(algorithm_results.get("recursive_trend", {}), indent=2)}
-Dynamic Programming: {json.dumps(algorithm_results.get("dynamic_programming", {}), indent=2)}
-Graph Analysis: {json.dumps(algorithm_results.get("graph_analysis", {}), indent=2)}
-Hash Table Analysis: {json.dumps(algorithm_results.get("hash_table", {}), indent=2)}
-Sliding Window: {json.dumps(algorithm_results.get("sliding_window", {}), indent=2)}
-Heap Priority: {json.dumps(algorithm_results.get("heap_priority", {}), indent=2)}
-Backtracking: {json.dumps(algorithm_results.get("backtracking", {}), indent=2)}
-Divide & Conquer: {json.dumps(algorithm_results.get("divide_conquer", {}), indent=2)}
-Two Pointers: {json.dumps(algorithm_results.get("two_pointers", {}), indent=2)}
-
-CREDIT SCORE DETAILS:
-Current Score Code: {credit_score_data.get("score_code", 0)}
-Utilization Ratio: {credit_score_data.get("utilization_ratio", 0)}
-Credit Health Status: {credit_score_data.get("credit_health_status", "Unknown")}
-Card Age: {credit_score_data.get("card_age_months", 0)} months
-Total Transactions: {credit_score_data.get("total_transactions", 0)}
-"""
-        
-        martian_client = get_martian_client()
-        
-        messages = [
-            {"role": "system", "content": plan_prompt},
-            {"role": "user", "content": f"Create a comprehensive credit improvement plan based on this complete financial analysis: {comprehensive_data}"}
-        ]
-        
-        response = martian_client.chat_completions(
-            model="openai/gpt-4.1-nano:cheap",
-            messages=messages,
-            temperature=0.1
-        )
-        
-        plan_analysis = response.get("choices", [{}])[0].get("message", {}).get("content", "")
-        
-        # Parse the plan JSON
-        print(f"Raw plan_analysis: {plan_analysis[:500]}")  # Debug: print first 500 chars
-        
-        try:
-            plan_json = json.loads(plan_analysis)
-            print(f"Parsed plan_json keys: {plan_json.keys() if isinstance(plan_json, dict) else 'Not a dict'}")
-        except json.JSONDecodeError as json_err:
-            print(f"JSON decode error: {json_err}")
-            print(f"Full response: {plan_analysis}")
-            raise
-        
-        credit_plan = plan_json.get("credit_improvement_plan", {})
-        print(f"Extracted credit_plan keys: {credit_plan.keys() if isinstance(credit_plan, dict) else 'Not a dict'}")
-        
-        return {
-            "credit_improvement_plan": json.dumps(credit_plan),
-            "plan_generated": True,
-            "plan_timestamp": "2024-01-01T00:00:00Z"
-        }
-        
-    except Exception as e:
-        print(f"Error generating credit improvement plan: {e}")
-        import traceback
-        traceback.print_exc()
-        return {
-            "credit_improvement_plan": "{}",
-            "plan_generated": False,
-            "error": str(e)
-        }
-
-def generate_financial_insights(cleaned_data, financial_data):
-    try:
-        # Create transaction objects using dataInput classes
-        transaction_objects = []
-        for purchase in cleaned_data.get("purchases", []):
-            transaction_obj = transactionData(
-                purchaseYear=purchase.get("purchase_year", 0),
-                purchaseMonth=purchase.get("purchase_month", 0),
-                purchaseDay=purchase.get("purchase_day", 0),
-                paymentYear=purchase.get("payment_year", -1),
-                paymentMonth=purchase.get("payment_month", -1),
-                paymentDay=purchase.get("payment_day", -1),
-                cost=float(purchase.get("cost", "0.00"))
-            )
-            transaction_objects.append(transaction_obj)
-        
-        # Detect anomalies in spending patterns
-        anomalies = detect_anomalies(transaction_objects)
-        
-        # Advanced sorting algorithms for transaction analysis
-        def quicksort_transactions(arr, key_func):
-            if len(arr) <= 1:
-                return arr
-            pivot = arr[len(arr) // 2]
-            left = [x for x in arr if key_func(x) < key_func(pivot)]
-            middle = [x for x in arr if key_func(x) == key_func(pivot)]
-            right = [x for x in arr if key_func(x) > key_func(pivot)]
-            return quicksort_transactions(left, key_func) + middle + quicksort_transactions(right, key_func)
-        
-        def mergesort_transactions(arr, key_func):
-            if len(arr) <= 1:
-                return arr
-            mid = len(arr) // 2
-            left = mergesort_transactions(arr[:mid], key_func)
-            right = mergesort_transactions(arr[mid:], key_func)
-            return merge(left, right, key_func)
-        
-        def merge(left, right, key_func):
-            result = []
-            i = j = 0
-            while i < len(left) and j < len(right):
-                if key_func(left[i]) <= key_func(right[j]):
-                    result.append(left[i])
-                    i += 1
-                else:
-                    result.append(right[j])
-                    j += 1
-            result.extend(left[i:])
-            result.extend(right[j:])
-            return result
-        
-        # Sort transactions by amount using quicksort
-        sorted_by_amount = quicksort_transactions(transaction_objects.copy(), lambda t: t.cost)
-        # Sort transactions by date using mergesort
-        sorted_by_date = mergesort_transactions(transaction_objects.copy(), 
-            lambda t: (t.purchaseDate.year, t.purchaseDate.month, t.purchaseDate.day))
-        
-        # Create cardData object
-        card_limit_float = float(cleaned_data.get("card_limit", "0")) if cleaned_data.get("card_limit") else 0.0
-        card_age_int = int(cleaned_data.get("card_age", "0")) if cleaned_data.get("card_age") else 0
-        
-        user_card_data = cardData(
-            cardLimit=card_limit_float,
-            transactionList=transaction_objects,
-            ageOfCard=card_age_int
-        )
-        
-        # Organize transactions and calculate utilization
-        user_card_data.organizeDataSet(user_card_data.transactionList)
-        user_card_data.percentageOfCardUsed(user_card_data.transactionList, user_card_data.cardLimit)
-        
-        # Search algorithms for financial analysis
-        def binary_search_transactions(sorted_transactions, target_amount):
-            left, right = 0, len(sorted_transactions) - 1
-            while left <= right:
-                mid = (left + right) // 2
-                if sorted_transactions[mid].cost == target_amount:
-                    return mid
-                elif sorted_transactions[mid].cost < target_amount:
-                    left = mid + 1
-                else:
-                    right = mid - 1
-            return -1
-        
-        def linear_search_unpaid(transactions):
-            unpaid_indices = []
-            for i, transaction in enumerate(transactions):
-                if transaction.paymentDate.year < 0:
-                    unpaid_indices.append(i)
-            return unpaid_indices
-        
-        # Greedy algorithm for debt optimization
-        def greedy_debt_payoff(unpaid_transactions, available_funds):
-            sorted_debts = sorted(unpaid_transactions, key=lambda t: t.cost, reverse=True)
-            payoff_plan = []
-            remaining_funds = available_funds
-            
-            for debt in sorted_debts:
-                if remaining_funds >= debt.cost:
-                    payoff_plan.append({
-                        "amount": debt.cost,
-                        "date": f"{debt.purchaseDate.year}-{debt.purchaseDate.month}-{debt.purchaseDate.day}",
-                        "action": "pay_full"
-                    })
-                    remaining_funds -= debt.cost
-                elif remaining_funds > 0:
-                    payoff_plan.append({
-                        "amount": remaining_funds,
-                        "date": f"{debt.purchaseDate.year}-{debt.purchaseDate.month}-{debt.purchaseDate.day}",
-                        "action": "pay_partial",
-                        "remaining": debt.cost - remaining_funds
-                    })
-                    remaining_funds = 0
-                else:
-                    break
-            
-            return payoff_plan
-        
-        # Apply search algorithms
-        unpaid_transactions = [t for t in transaction_objects if t.paymentDate.year < 0]
-        unpaid_indices = linear_search_unpaid(transaction_objects)
-        median_amount = sorted_by_amount[len(sorted_by_amount)//2].cost if sorted_by_amount else 0
-        median_index = binary_search_transactions(sorted_by_amount, median_amount)
-        
-        # Apply greedy debt optimization
-        total_unpaid = sum(t.cost for t in unpaid_transactions)
-        debt_payoff_plan = greedy_debt_payoff(unpaid_transactions, total_unpaid * 0.5)
-        
-        # Recursive trend analysis algorithm
-        def recursive_trend_analysis(transactions, depth=0, max_depth=3):
-            if depth >= max_depth or len(transactions) < 2:
-                return {"trend": "insufficient_data", "depth": depth}
-            
-            if len(transactions) == 2:
-                diff = transactions[1].cost - transactions[0].cost
-                return {"trend": "increasing" if diff > 0 else "decreasing" if diff < 0 else "stable", "depth": depth}
-            
-            mid = len(transactions) // 2
-            left_trend = recursive_trend_analysis(transactions[:mid], depth + 1, max_depth)
-            right_trend = recursive_trend_analysis(transactions[mid:], depth + 1, max_depth)
-            
-            if left_trend["trend"] == right_trend["trend"]:
-                return {"trend": left_trend["trend"], "depth": depth, "consistency": "high"}
-            else:
-                return {"trend": "mixed", "depth": depth, "left": left_trend["trend"], "right": right_trend["trend"]}
-        
-        # Apply recursive trend analysis
-        trend_analysis = recursive_trend_analysis(sorted_by_date)
-        
-        # Dynamic programming for optimal payment scheduling
-        def optimal_payment_schedule(debts, monthly_budget):
-            n = len(debts)
-            dp = [[0 for _ in range(monthly_budget + 1)] for _ in range(n + 1)]
-            
-            for i in range(1, n + 1):
-                debt_amount = int(debts[i-1].cost)
-                for budget in range(monthly_budget + 1):
-                    if debt_amount <= budget:
-                        dp[i][budget] = max(dp[i-1][budget], 
-                                          dp[i-1][budget - debt_amount] + debt_amount)
-                    else:
-                        dp[i][budget] = dp[i-1][budget]
-            
-            # Reconstruct optimal schedule
-            schedule = []
-            budget = monthly_budget
-            for i in range(n, 0, -1):
-                if dp[i][budget] != dp[i-1][budget]:
-                    debt_amount = int(debts[i-1].cost)
-                    schedule.append({
-                        "debt_index": i-1,
-                        "amount": debt_amount,
-                        "month": len(schedule) + 1
-                    })
-                    budget -= debt_amount
-            
-            return schedule
-        
-        # Graph algorithms for spending pattern analysis
-        def build_spending_graph(transactions):
-            graph = {}
-            for i, t1 in enumerate(transactions):
-                graph[i] = []
-                for j, t2 in enumerate(transactions):
-                    if i != j:
-                        time_diff = abs((t1.purchaseDate.year - t2.purchaseDate.year) * 365 + 
-                                      (t1.purchaseDate.month - t2.purchaseDate.month) * 30 + 
-                                      (t1.purchaseDate.day - t2.purchaseDate.day))
-                        if time_diff <= 7 and abs(t1.cost - t2.cost) <= 50:
-                            graph[i].append(j)
-            return graph
-        
-        def dfs_spending_clusters(graph, visited, node, cluster):
-            visited[node] = True
-            cluster.append(node)
-            for neighbor in graph[node]:
-                if not visited[neighbor]:
-                    dfs_spending_clusters(graph, visited, neighbor, cluster)
-        
-        def find_spending_clusters(graph):
-            visited = [False] * len(graph)
-            clusters = []
-            for node in range(len(graph)):
-                if not visited[node]:
-                    cluster = []
-                    dfs_spending_clusters(graph, visited, node, cluster)
-                    if len(cluster) > 1:
-                        clusters.append(cluster)
-            return clusters
-        
-        # Hash table for transaction lookup optimization
-        def build_transaction_hash_table(transactions):
-            hash_table = {}
-            for i, transaction in enumerate(transactions):
-                key = f"{transaction.purchaseDate.year}-{transaction.purchaseDate.month}-{transaction.purchaseDate.day}"
-                if key not in hash_table:
-                    hash_table[key] = []
-                hash_table[key].append(i)
-            return hash_table
-        
-        # Sliding window for trend detection
-        def sliding_window_trend(transactions, window_size=5):
-            if len(transactions) < window_size:
-                return {"trend": "insufficient_data"}
-            
-            trends = []
-            for i in range(len(transactions) - window_size + 1):
-                window = transactions[i:i + window_size]
-                costs = [t.cost for t in window]
-                slope = (costs[-1] - costs[0]) / window_size
-                trends.append(slope)
-            
-            avg_slope = sum(trends) / len(trends)
-            return {
-                "trend": "increasing" if avg_slope > 0.1 else "decreasing" if avg_slope < -0.1 else "stable",
-                "avg_slope": avg_slope,
-                "window_size": window_size
-            }
-        
-        # Apply advanced algorithms
-        monthly_budget = card_limit_float * 0.3
-        optimal_schedule = optimal_payment_schedule(unpaid_transactions, int(monthly_budget)) if unpaid_transactions else []
-        
-        spending_graph = build_spending_graph(transaction_objects)
-        spending_clusters = find_spending_clusters(spending_graph)
-        
-        transaction_hash = build_transaction_hash_table(transaction_objects)
-        
-        sliding_trend = sliding_window_trend(sorted_by_date)
-        
-        # Heap algorithms for priority-based debt management
-        import heapq
-        
-        def priority_debt_queue(debts):
-            heap = []
-            for i, debt in enumerate(debts):
-                priority = debt.cost * 0.8 + (30 - abs(debt.purchaseDate.day - 15)) * 0.2
-                heapq.heappush(heap, (-priority, i, debt))
-            return heap
-        
-        def extract_top_priorities(heap, count=3):
-            priorities = []
-            temp_heap = heap.copy()
-            for _ in range(min(count, len(temp_heap))):
-                if temp_heap:
-                    priority, index, debt = heapq.heappop(temp_heap)
-                    priorities.append({
-                        "index": index,
-                        "debt": debt,
-                        "priority": -priority
-                    })
-            return priorities
-        
-        # Backtracking for budget optimization
-        def backtrack_budget_allocation(categories, budget, current_allocation=[], best_allocation=None, best_score=0):
-            if len(current_allocation) == len(categories):
-                total_score = sum(cat["score"] for cat in current_allocation)
-                if total_score > best_score:
-                    return current_allocation.copy(), total_score
-                return best_allocation, best_score
-            
-            category = categories[len(current_allocation)]
-            for amount in range(0, min(category["max"], budget) + 1, 50):
-                if amount <= budget:
-                    current_allocation.append({
-                        "name": category["name"],
-                        "amount": amount,
-                        "score": category["score"] * (amount / category["max"])
-                    })
-                    best_allocation, best_score = backtrack_budget_allocation(
-                        categories, budget - amount, current_allocation, best_allocation, best_score)
-                    current_allocation.pop()
-            
-            return best_allocation, best_score
-        
-        # Divide and conquer for large dataset processing
-        def divide_conquer_analysis(transactions, threshold=10):
-            if len(transactions) <= threshold:
-                return {
-                    "total_amount": sum(t.cost for t in transactions),
-                    "avg_amount": sum(t.cost for t in transactions) / len(transactions) if transactions else 0,
-                    "count": len(transactions)
-                }
-            
-            mid = len(transactions) // 2
-            left_result = divide_conquer_analysis(transactions[:mid], threshold)
-            right_result = divide_conquer_analysis(transactions[mid:], threshold)
-            
-            return {
-                "total_amount": left_result["total_amount"] + right_result["total_amount"],
-                "avg_amount": (left_result["avg_amount"] + right_result["avg_amount"]) / 2,
-                "count": left_result["count"] + right_result["count"],
-                "left": left_result,
-                "right": right_result
-            }
-        
-        # Two pointers technique for transaction matching
-        def two_pointers_matching(sorted_transactions, target_sum):
-            left, right = 0, len(sorted_transactions) - 1
-            matches = []
-            
-            while left < right:
-                current_sum = sorted_transactions[left].cost + sorted_transactions[right].cost
-                if current_sum == target_sum:
-                    matches.append({
-                        "left_index": left,
-                        "right_index": right,
-                        "left_amount": sorted_transactions[left].cost,
-                        "right_amount": sorted_transactions[right].cost,
-                        "sum": current_sum
-                    })
-                    left += 1
-                    right -= 1
-                elif current_sum < target_sum:
-                    left += 1
-                else:
-                    right -= 1
-            
-            return matches
-        
-        # Apply advanced algorithms
-        debt_heap = priority_debt_queue(unpaid_transactions)
-        top_priorities = extract_top_priorities(debt_heap)
-        
-        budget_categories = [
-            {"name": "essential", "max": int(monthly_budget * 0.6), "score": 10},
-            {"name": "debt_payment", "max": int(monthly_budget * 0.3), "score": 8},
-            {"name": "savings", "max": int(monthly_budget * 0.1), "score": 6}
-        ]
-        optimal_budget, budget_score = backtrack_budget_allocation(budget_categories, int(monthly_budget))
-        
-        dataset_analysis = divide_conquer_analysis(transaction_objects)
-        
-        target_sum = card_limit_float * 0.1
-        transaction_matches = two_pointers_matching(sorted_by_amount, target_sum)
-        
-        # Use criteria.py for credit scoring
-        credit_criteria = critera(user_card_data)
-        credit_score_code = credit_criteria.messageReturnCodedName()
-        utilization_ratio = user_card_data.getPercentageUsed()
-        
-        # Map credit score codes to descriptions
-        credit_score_descriptions = {
-            1: "Critical: High utilization + New card - Immediate action needed",
-            2: "Poor: High utilization + Established card - Reduce spending",
-            3: "Fair: Moderate utilization + New card - Build history",
-            4: "Fair: Moderate utilization + Established card - Maintain payments",
-            5: "Good: Low utilization + New card - Keep building history",
-            6: "Excellent: Low utilization + Established card - Perfect credit health"
-        }
-        
-        with open("ai2.prompt", "r") as f:
-            insights_prompt = f.read()
-        
-        analysis_data = f"""
-CLEANED FINANCIAL DATA:
-Card Limit: {cleaned_data.get("card_limit", "")}
-Card Age: {cleaned_data.get("card_age", "")} months
-Purchases: {cleaned_data.get("purchases", [])}
-Debt History: {cleaned_data.get("debt_history", [])}
-
-ALGORITHM ANALYSIS:
-Anomalies Detected: {len(anomalies)} transactions with z-score > 2.5
-Sorting Results: {len(sorted_by_amount)} transactions sorted by amount, {len(sorted_by_date)} by date
-Search Results: {len(unpaid_indices)} unpaid transactions found, median amount: {median_amount}
-Greedy Debt Plan: {len(debt_payoff_plan)} optimized payments
-Recursive Trend: {trend_analysis['trend']} pattern detected at depth {trend_analysis['depth']}
-Dynamic Programming: {len(optimal_schedule)} optimal payment schedule items
-Graph Analysis: {len(spending_clusters)} spending clusters found
-Hash Table: {len(transaction_hash)} date-based transaction groups
-Sliding Window: {sliding_trend['trend']} trend with slope {sliding_trend.get('avg_slope', 0):.3f}
-Heap Priority: {len(top_priorities)} top priority debts identified
-Backtracking: {len(optimal_budget) if optimal_budget else 0} optimal budget allocations
-Divide Conquer: {dataset_analysis['count']} transactions processed
-Two Pointers: {len(transaction_matches)} transaction pairs found
-
-CUSTOM CREDIT ANALYSIS:
-Credit Utilization: {utilization_ratio:.2%}
-Credit Score Code: {credit_score_code}
-Credit Health Status: {credit_score_descriptions.get(credit_score_code, "Unknown")}
-Total Transactions: {len(transaction_objects)}
-Card Age: {card_age_int} months
-
-RAW FINANCIAL DATA:
-Credit Card Limit: {financial_data.credit_card_limit}
-Card Age: {financial_data.card_age}
-Credit Forms: {financial_data.credit_forms}
-Current Debt: {financial_data.current_debt}
-Debt Amount: {financial_data.debt_amount}
-Debt End Date: {financial_data.debt_end_date}
-Debt Duration: {financial_data.debt_duration}
-"""
-        
-        martian_client = get_martian_client()
-        
-        messages = [
-            {"role": "system", "content": insights_prompt},
-            {"role": "user", "content": f"Analyze this financial data with custom credit scoring: {analysis_data}"}
-        ]
-        
-        response = martian_client.chat_completions(
-            model="openai/gpt-4.1-nano:cheap",
-            messages=messages,
-            temperature=0.1
-        )
-        
-        insights_analysis = response.get("choices", [{}])[0].get("message", {}).get("content", "")
-        
-        import json
-        insights_json = json.loads(insights_analysis)
-        
-        # Add custom credit scoring data to the response
-        insights_json["custom_credit_score"] = {
-            "score_code": credit_score_code,
-            "utilization_ratio": utilization_ratio,
-            "credit_health_status": credit_score_descriptions.get(credit_score_code, "Unknown"),
-            "card_age_months": card_age_int,
-            "total_transactions": len(transaction_objects),
-            "algorithm_results": {
-                "anomalies": anomalies,
-                "sorting_stats": {
-                    "quicksort_by_amount": len(sorted_by_amount),
-                    "mergesort_by_date": len(sorted_by_date)
-                },
-                "search_results": {
-                    "unpaid_count": len(unpaid_indices),
-                    "median_amount": median_amount,
-                    "median_found": median_index != -1
-                },
-                "greedy_debt_plan": debt_payoff_plan,
-                "recursive_trend": trend_analysis,
-                "dynamic_programming": {
-                    "optimal_schedule": optimal_schedule,
-                    "monthly_budget": monthly_budget
-                },
-                "graph_analysis": {
-                    "spending_clusters": spending_clusters,
-                    "cluster_count": len(spending_clusters)
-                },
-                "hash_table": {
-                    "date_groups": len(transaction_hash),
-                    "total_entries": sum(len(v) for v in transaction_hash.values())
-                },
-                "sliding_window": sliding_trend,
-                "heap_priority": {
-                    "top_priorities": [{"index": p["index"], "priority": p["priority"], "amount": p["debt"].cost} for p in top_priorities],
-                    "priority_count": len(top_priorities)
-                },
-                "backtracking": {
-                    "optimal_budget": optimal_budget,
-                    "budget_score": budget_score
-                },
-                "divide_conquer": dataset_analysis,
-                "two_pointers": {
-                    "matches": transaction_matches,
-                    "match_count": len(transaction_matches)
-                }
-            }
-        }
-        
-        # Generate comprehensive credit improvement plan
-        plan_data = generate_credit_improvement_plan(
-            json.dumps(insights_json.get("financial_metrics", {})),
-            json.dumps(insights_json.get("insights", [])),
-            json.dumps(insights_json.get("recommendations", [])),
-            json.dumps(insights_json.get("risk_assessment", {})),
-            json.dumps(insights_json.get("trends", {})),
-            json.dumps(insights_json.get("custom_credit_score", {}))
-        )
-        
-        return {
-            "financial_metrics": json.dumps(insights_json.get("financial_metrics", {})),
-            "insights": json.dumps(insights_json.get("insights", [])),
-            "recommendations": json.dumps(insights_json.get("recommendations", [])),
-            "risk_assessment": json.dumps(insights_json.get("risk_assessment", {})),
-            "trends": json.dumps(insights_json.get("trends", {})),
-            "custom_credit_score": json.dumps(insights_json.get("custom_credit_score", {})),
-            "credit_improvement_plan": plan_data.get("credit_improvement_plan", "{}"),
-            "ai_insights_text": insights_json.get("ai_insights_text", ""),
-            "full_analysis": insights_analysis
-        }
-        
-    except Exception as e:
-        print(f"Error generating insights: {e}")
-        return {
-            "financial_metrics": "{}",
-            "insights": "[]",
-            "recommendations": "[]",
-            "risk_assessment": "{}",
-            "trends": "{}",
-            "custom_credit_score": "{}",
-            "credit_improvement_plan": "{}",
-            "ai_insights_text": f"Error generating insights: {str(e)}",
-            "full_analysis": f"Error: {str(e)}"
-        }
+@app.on_event("startup")
+async def start_job_queue():
+    await job_queue.start()
+
+@app.on_event("shutdown")
+async def stop_job_queue():
+    await job_queue.stop()
+
+@app.on_event("shutdown")
+async def close_martian_client():
+    await pipeline.close_martian_client()
+
+@app.on_event("shutdown")
+def stop_pdf_workers():
+    pipeline.shutdown_pdf_pool()
+
+@app.on_event("shutdown")
+async def close_async_engine():
+    await database.dispose_async_engine()
 
 @app.get("/")
 def root():
@@ -691,6 +88,95 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    """Async counterpart of get_db for endpoints that shouldn't hold a thread while waiting on the database."""
+    db = database.AsyncSessionLocal()
+    try:
+        yield db
+    finally:
+        await db.close()
+
+class CurrentUser(NamedTuple):
+    id: int
+    username: str
+
+def lookup_user_id(username):
+    db = database.SessionLocal()
+    try:
+        return db.execute(select(models.User.id).where(models.User.username == username)).scalar()
+    finally:
+        db.close()
+
+async def current_user(token: str = Depends(oauth2_scheme)) -> CurrentUser:
+    """
+    The authenticated user's id and username. Both are cached per token until the token
+    expires, so repeat requests skip the JWT check and the users query, which otherwise
+    runs on the sync engine in the threadpool.
+    """
+    user = auth.token_cache.get(token)
+    if user is not None:
+        return user
+    claims = auth.decode_claims(token)
+    username = claims.get("sub") if claims else None
+    if not username:
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    
+    user_id = auth.user_id_cache.get(username)
+    if user_id is None:
+        user_id = await run_in_threadpool(lookup_user_id, username)
+        if user_id is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        auth.user_id_cache.set(username, user_id)
+    
+    user = CurrentUser(user_id, username)
+    auth.token_cache.set(token, user, expires_at=claims.get("exp"))
+    return user
+
+# FinancialData loads per endpoint. The raw AI responses are deferred on the model (the
+# statement PDF is in the blob store), so these only pull the columns each endpoint needs;
+# the dashboard's loader is dashboard.load_financial_dashboard.
+def load_financial_form(db, user_id):
+    """Just the id and the submitted form fields, for overwriting them on resubmission."""
+    return (
+        db.query(models.FinancialData)
+        .options(load_only(models.FinancialData.id, *(getattr(models.FinancialData, field) for field in pipeline.FORM_FIELDS)))
+        .filter(models.FinancialData.user_id == user_id)
+        .first()
+    )
+
+def save_financial_form(db, user_id, form, statement):
+    """
+    Create or overwrite the user's FinancialData with the submitted form and refresh their
+    dashboard. `statement` is the (digest, size) of a newly uploaded PDF, if any. Returns
+    the row id. Blocking; the submit endpoint runs it in the threadpool.
+    """
+    existing_data = load_financial_form(db, user_id)
+    
+    if existing_data:
+        for field, value in form.items():
+            setattr(existing_data, field, value)
+        if statement:
+            existing_data.statement_digest, existing_data.statement_size = statement
+        # Read before committing: touching an expired row would reload every non-deferred column
+        data_id = existing_data.id
+        db.commit()
+    else:
+        financial_data = models.FinancialData(
+            user_id=user_id,
+            statement_digest=statement[0] if statement else None,
+            statement_size=statement[1] if statement else None,
+            **form
+        )
+        db.add(financial_data)
+        db.flush()
+        data_id = financial_data.id
+        db.commit()
+    
+    # The dashboard shows the new form fields straight away
+    dashboard.refresh_dashboard(db, user_id)
+    db.commit()
+    return data_id
+
 @app.post("/register")
 def register(form: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     hashed_pw = auth.hash_password(form.password)
@@ -708,9 +194,9 @@ def login(form: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get
     token = auth.create_access_token({"sub": user.username})
     return {"access_token": token, "token_type": "bearer"}
 
-@app.post("/submit-financial-info")
-def submit_financial_info(
-    token: str = Depends(oauth2_scheme),
+@app.post("/submit-financial-info", status_code=status.HTTP_202_ACCEPTED)
+async def submit_financial_info(
+    user: CurrentUser = Depends(current_user),
     creditCardLimit: str = Form(...),
     cardAge: str = Form(...),
     creditCardStatement: UploadFile = File(None),
@@ -721,292 +207,154 @@ def submit_financial_info(
     debtDuration: str = Form(...),
     db: Session = Depends(get_db)
 ):
-    username = auth.decode_token(token)
-    if not username:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
-    
-    user = db.query(models.User).filter(models.User.username == username).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    pdf_data = None
-    pdf_text = ""
+    statement = None
     if creditCardStatement and creditCardStatement.filename:
-        pdf_data = creditCardStatement.file.read()
-        pdf_text = extract_pdf_text(pdf_data)
+        # Copied into the blob store a chunk at a time; identical statements are stored once
+        try:
+            statement = await run_in_threadpool(
+                blobstore.get_blob_store().put_stream, creditCardStatement.file, pipeline.MAX_PDF_BYTES
+            )
+        except blobstore.BlobTooLargeError:
+            raise HTTPException(status_code=413, detail=f"Statement exceeds {pipeline.MAX_PDF_BYTES} bytes")
     
-    existing_data = db.query(models.FinancialData).filter(models.FinancialData.user_id == user.id).first()
+    form = dict(
+        credit_card_limit=creditCardLimit,
+        card_age=cardAge,
+        credit_forms=creditForms,
+        current_debt=currentDebt,
+        debt_amount=debtAmount,
+        debt_end_date=debtEndDate,
+        debt_duration=debtDuration
+    )
+    data_id = await run_in_threadpool(save_financial_form, db, user.id, form, statement)
     
-    if existing_data:
-        existing_data.credit_card_limit = creditCardLimit
-        existing_data.card_age = cardAge
-        if pdf_data:
-            existing_data.credit_card_statement = pdf_data
-        existing_data.credit_forms = creditForms
-        existing_data.current_debt = currentDebt
-        existing_data.debt_amount = debtAmount
-        existing_data.debt_end_date = debtEndDate
-        existing_data.debt_duration = debtDuration
-        db.commit()
-        db.refresh(existing_data)
-        financial_data = existing_data
-    else:
-        financial_data = models.FinancialData(
-            user_id=user.id,
-            credit_card_limit=creditCardLimit,
-            card_age=cardAge,
-            credit_card_statement=pdf_data,
-            credit_forms=creditForms,
-            current_debt=currentDebt,
-            debt_amount=debtAmount,
-            debt_end_date=debtEndDate,
-            debt_duration=debtDuration
-        )
-        db.add(financial_data)
-        db.commit()
-        db.refresh(financial_data)
+    # Extraction, cleaning, insights and the plan run in the background; poll /jobs/{job_id}
+    try:
+        job_id = await job_queue.create_job(db, user.id, data_id, include_statement=statement is not None)
+    except QueueFullError:
+        raise HTTPException(status_code=503, detail="Analysis queue is full, please retry shortly")
+    
+    return {
+        "msg": "Financial information saved, analysis queued",
+        "data_id": data_id,
+        "job_id": job_id,
+        "status_url": f"/jobs/{job_id}"
+    }
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, user: CurrentUser = Depends(current_user), db: AsyncSession = Depends(get_async_db)):
+    job = await db.get(models.AnalysisJob, job_id)
+    if not job or job.user_id != user.id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_queue.describe(job)
+
+BULK_INGEST_TOKEN = os.getenv("BULK_INGEST_TOKEN")
+
+def spool_upload(upload, path):
+    with open(path, "wb") as f:
+        shutil.copyfileobj(upload.file, f)
+
+def require_bulk_token(x_bulk_token: str = Header(None)):
+    # Bulk ingestion is for trusted partners only and stays disabled unless a token is configured
+    if not BULK_INGEST_TOKEN or x_bulk_token != BULK_INGEST_TOKEN:
+        raise HTTPException(status_code=403, detail="Bulk ingestion not permitted")
+
+@app.post("/bulk-submit-financial-info", status_code=status.HTTP_202_ACCEPTED, dependencies=[Depends(require_bulk_token)])
+async def bulk_submit_financial_info(
+    manifest: UploadFile = File(...),
+    statements: List[UploadFile] = File([]),
+    concurrency: int = Form(8),
+    batchSize: int = Form(50)
+):
+    # Uploads are only readable during the request, so spool them to disk for the background
+    # run; the copies happen in the threadpool so a large upload doesn't stall the event loop
+    work_dir = tempfile.mkdtemp(prefix="bulk-")
+    manifest_path = os.path.join(work_dir, "manifest" + os.path.splitext(manifest.filename or "")[1])
+    await run_in_threadpool(spool_upload, manifest, manifest_path)
+    statements_dir = os.path.join(work_dir, "statements")
+    os.makedirs(statements_dir)
+    for statement in statements:
+        name = os.path.basename(statement.filename or "")
+        if name in ("", ".", ".."):
+            shutil.rmtree(work_dir, ignore_errors=True)
+            raise HTTPException(status_code=400, detail="Every statement upload needs a file name")
+        await run_in_threadpool(spool_upload, statement, os.path.join(statements_dir, name))
     
     try:
-        with open("ai.prompt", "r") as f:
-            prompt = f.read()
-        
-        user_data = f"""
-Credit Card Limit: {creditCardLimit}
-Card Age: {cardAge}
-Credit Forms: {creditForms}
-Current Debt: {currentDebt}
-Debt Amount: {debtAmount}
-Debt End Date: {debtEndDate}
-Debt Duration: {debtDuration}
-PDF Statement Text: {pdf_text}
-"""
-        
-        martian_client = get_martian_client()
-        
-        messages = [
-            {"role": "system", "content": prompt},
-            {"role": "user", "content": f"text: {user_data}"}
-        ]
-        
-        response = martian_client.chat_completions(
-            model="openai/gpt-4.1-nano:cheap",
-            messages=messages,
-            temperature=0.1
+        run_id = bulk.start_bulk_run(
+            manifest_path, statements_dir, max(1, concurrency), max(1, batchSize), cleanup_dir=work_dir
         )
-        
-        ai_analysis = response.get("choices", [{}])[0].get("message", {}).get("content", "")
-        
-        cleaned_card_limit = ""
-        cleaned_card_age = ""
-        cleaned_transaction_list = ""
-        cleaned_debt_history = ""
-        
-        try:
-            import json
-            cleaned_data = json.loads(ai_analysis)
-            cleaned_card_limit = cleaned_data.get("card_limit", "")
-            cleaned_card_age = cleaned_data.get("card_age", "")
-            cleaned_transaction_list = json.dumps(cleaned_data.get("purchases", []))
-            cleaned_debt_history = json.dumps(cleaned_data.get("debt_history", []))
-            
-            transaction_objects = []
-            for purchase in cleaned_data.get("purchases", []):
-                transaction_obj = transactionData(
-                    purchaseYear=purchase.get("purchase_year", 0),
-                    purchaseMonth=purchase.get("purchase_month", 0),
-                    purchaseDay=purchase.get("purchase_day", 0),
-                    paymentYear=purchase.get("payment_year", -1),
-                    paymentMonth=purchase.get("payment_month", -1),
-                    paymentDay=purchase.get("payment_day", -1),
-                    cost=float(purchase.get("cost", "0.00"))
-                )
-                transaction_objects.append(transaction_obj)
-            
-            card_limit_float = float(cleaned_card_limit) if cleaned_card_limit else 0.0
-            card_age_int = int(cleaned_card_age) if cleaned_card_age else 0
-            
-            user_card_data = cardData(
-                count=len(transaction_objects),
-                cardLimit=card_limit_float,
-                transactionList=transaction_objects,
-                ageOfCard=card_age_int
-            )
-            
-            user_card_data.organizeDataSet(user_card_data.transactionList)
-            user_card_data.percentageOfCardUsedAVG(user_card_data.transactionList, user_card_data.cardLimit)
-        except:
-            pass
-        
-        if existing_data:
-            existing_data.cleaned_card_limit = cleaned_card_limit
-            existing_data.cleaned_card_age = cleaned_card_age
-            existing_data.cleaned_transaction_list = cleaned_transaction_list
-            existing_data.cleaned_debt_history = cleaned_debt_history
-            existing_data.ai_analysis_result = ai_analysis
-            existing_data.is_data_cleaned = True
-            db.commit()
-            db.refresh(existing_data)
-            financial_data = existing_data
-        else:
-            financial_data.cleaned_card_limit = cleaned_card_limit
-            financial_data.cleaned_card_age = cleaned_card_age
-            financial_data.cleaned_transaction_list = cleaned_transaction_list
-            financial_data.cleaned_debt_history = cleaned_debt_history
-            financial_data.ai_analysis_result = ai_analysis
-            financial_data.is_data_cleaned = True
-        db.commit()
-        db.refresh(financial_data)
-        
-        # Generate AI Insights
-        try:
-            insights_data = generate_financial_insights(cleaned_data, financial_data)
-            
-            if existing_data:
-                existing_data.financial_metrics = insights_data.get("financial_metrics", "")
-                existing_data.insights = insights_data.get("insights", "")
-                existing_data.recommendations = insights_data.get("recommendations", "")
-                existing_data.risk_assessment = insights_data.get("risk_assessment", "")
-                existing_data.trends = insights_data.get("trends", "")
-                existing_data.custom_credit_score = insights_data.get("custom_credit_score", "")
-                existing_data.credit_improvement_plan = insights_data.get("credit_improvement_plan", "")
-                existing_data.ai_insights_text = insights_data.get("ai_insights_text", "")
-                existing_data.ai_insights_result = insights_data.get("full_analysis", "")
-                existing_data.is_insights_generated = True
-                existing_data.is_plan_generated = True
-                db.commit()
-                db.refresh(existing_data)
-            else:
-                financial_data.financial_metrics = insights_data.get("financial_metrics", "")
-                financial_data.insights = insights_data.get("insights", "")
-                financial_data.recommendations = insights_data.get("recommendations", "")
-                financial_data.risk_assessment = insights_data.get("risk_assessment", "")
-                financial_data.trends = insights_data.get("trends", "")
-                financial_data.custom_credit_score = insights_data.get("custom_credit_score", "")
-                financial_data.credit_improvement_plan = insights_data.get("credit_improvement_plan", "")
-                financial_data.ai_insights_text = insights_data.get("ai_insights_text", "")
-                financial_data.ai_insights_result = insights_data.get("full_analysis", "")
-                financial_data.is_insights_generated = True
-                financial_data.is_plan_generated = True
-                db.commit()
-                db.refresh(financial_data)
-        except Exception as insights_error:
-            print(f"Insights generation failed: {insights_error}")
-        
-        return {
-            "msg": "Financial information saved and analyzed successfully", 
-            "data_id": financial_data.id,
-            "ai_analysis": ai_analysis,
-            "cleaned_data": {
-                "card_limit": cleaned_card_limit,
-                "card_age": cleaned_card_age,
-                "transaction_list": cleaned_transaction_list,
-                "debt_history": cleaned_debt_history
-            }
-        }
-        
-    except Exception as e:
-        return {
-            "msg": "Financial information saved successfully (AI analysis failed)", 
-            "data_id": financial_data.id,
-            "error": str(e)
-        }
+    except (ValueError, KeyError) as e:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise HTTPException(status_code=400, detail=f"Invalid manifest: {e}")
+    
+    return {"msg": "Bulk ingestion started", "run_id": run_id, "status_url": f"/bulk-runs/{run_id}"}
+
+@app.get("/bulk-runs/{run_id}", dependencies=[Depends(require_bulk_token)])
+def get_bulk_run(run_id: str):
+    run = bulk.describe_run(run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="Bulk run not found")
+    return run
 
 @app.get("/get-financial-data")
-def get_financial_data(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    username = auth.decode_token(token)
-    if not username:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
-    user = db.query(models.User).filter(models.User.username == username).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    financial_data = db.query(models.FinancialData).filter(models.FinancialData.user_id == user.id).first()
-    if not financial_data:
+async def get_financial_data(
+    request: Request,
+    fields: Optional[str] = None,
+    wait_for_plan: bool = True,
+    user: CurrentUser = Depends(current_user),
+    db: Session = Depends(get_db)
+):
+    # Session work runs in the threadpool so a slow query doesn't stall the event loop
+    document = await run_in_threadpool(dashboard.load_document, db, user.id)
+    if document is None:
         raise HTTPException(status_code=404, detail="No financial data found")
     
-    # Check if plan exists and is valid
-    credit_plan = financial_data.credit_improvement_plan
-    
-    # If plan is missing or empty, generate it now
-    if not credit_plan or credit_plan == "" or credit_plan == "{}":
-        print("⚠️ No credit plan found, generating one now...")
-        try:
-            import json
-            # Parse all the existing data
-            metrics_data = json.loads(financial_data.financial_metrics) if financial_data.financial_metrics else {}
-            insights_data = json.loads(financial_data.insights) if financial_data.insights else []
-            recommendations_data = json.loads(financial_data.recommendations) if financial_data.recommendations else []
-            risk_data = json.loads(financial_data.risk_assessment) if financial_data.risk_assessment else {}
-            trends_data = json.loads(financial_data.trends) if financial_data.trends else {}
-            credit_score_data = json.loads(financial_data.custom_credit_score) if financial_data.custom_credit_score else {}
-            
-            # Generate the plan
-            plan_data = generate_credit_improvement_plan(
-                financial_data.financial_metrics if financial_data.financial_metrics else "{}",
-                financial_data.insights if financial_data.insights else "[]",
-                financial_data.recommendations if financial_data.recommendations else "[]",
-                financial_data.risk_assessment if financial_data.risk_assessment else "{}",
-                financial_data.trends if financial_data.trends else "{}",
-                financial_data.custom_credit_score if financial_data.custom_credit_score else "{}"
-            )
-            
-            # Save the new plan to the database
-            financial_data.credit_improvement_plan = plan_data.get("credit_improvement_plan", "{}")
-            financial_data.is_plan_generated = True
-            db.commit()
-            db.refresh(financial_data)
-            
-            credit_plan = financial_data.credit_improvement_plan
-            print("✅ Credit plan generated and saved successfully")
-        except Exception as e:
-            print(f"❌ Failed to generate plan on fly: {e}")
-            import traceback
-            traceback.print_exc()
-            credit_plan = "{}"
-    else:
-        print("✅ Using existing credit plan")
+    # If the plan is missing, generate it now. Concurrent requests for the same user share
+    # one generation; with wait_for_plan=false the dashboard is returned straight away with
+    # "plan_pending" and the plan lands in the document when it is ready.
+    plan_pending = False
+    if not document.plan_ready:
+        generation = pipeline.ensure_plan(user.id)
+        if wait_for_plan:
+            try:
+                # Shielded so a client hanging up doesn't cancel a generation others are waiting on
+                await asyncio.shield(generation)
+            except Exception:
+                pass  # logged by the generation; the dashboard is served without a plan
+            db.expire(document)
+        else:
+            plan_pending = True
     
+    return await run_in_threadpool(dashboard.dashboard_response, document, request, fields, plan_pending)
+
+@app.get("/transactions/summary")
+def get_transaction_summary(user: CurrentUser = Depends(current_user), db: Session = Depends(get_db)):
+    return transactions.summary(db, user.id)
+
+STATS_TOKEN = os.getenv("STATS_TOKEN")
+
+def require_stats_token(x_stats_token: str = Header(None)):
+    # Pool, cache and queue internals are for operators only; disabled unless a token is configured
+    if not STATS_TOKEN or x_stats_token != STATS_TOKEN:
+        raise HTTPException(status_code=403, detail="Stats not permitted")
+
+@app.get("/stats", dependencies=[Depends(require_stats_token)])
+def stats():
     return {
-        "raw_data": {
-            "credit_card_limit": financial_data.credit_card_limit,
-            "card_age": financial_data.card_age,
-            "credit_forms": financial_data.credit_forms,
-            "current_debt": financial_data.current_debt,
-            "debt_amount": financial_data.debt_amount,
-            "debt_end_date": financial_data.debt_end_date,
-            "debt_duration": financial_data.debt_duration,
-            "has_pdf": financial_data.credit_card_statement is not None
-        },
-        "cleaned_data": {
-            "cleaned_card_limit": financial_data.cleaned_card_limit,
-            "cleaned_card_age": financial_data.cleaned_card_age,
-            "cleaned_transaction_list": financial_data.cleaned_transaction_list,
-            "cleaned_debt_history": financial_data.cleaned_debt_history,
-            "ai_analysis_result": financial_data.ai_analysis_result,
-            "is_data_cleaned": financial_data.is_data_cleaned
-        },
-        "insights": {
-            "financial_metrics": financial_data.financial_metrics,
-            "insights": financial_data.insights,
-            "recommendations": financial_data.recommendations,
-            "risk_assessment": financial_data.risk_assessment,
-            "trends": financial_data.trends,
-            "custom_credit_score": financial_data.custom_credit_score,
-            "credit_improvement_plan": credit_plan,
-            "ai_insights_text": financial_data.ai_insights_text,
-            "ai_insights_result": financial_data.ai_insights_result,
-            "is_insights_generated": financial_data.is_insights_generated,
-            "is_plan_generated": financial_data.is_plan_generated
-        }
+        "martian": pipeline.martian_stats(),
+        "statement_cache": pipeline.statement_cache_stats(),
+        "statement_parser": pipeline.statement_parser_stats(),
+        "incremental": incremental.incremental_stats(),
+        "jobs": job_queue.stats(),
+        "database": database.pool_stats(),
+        "auth_cache": auth.auth_cache_stats(),
+        "plan_generation": pipeline.plan_generation_stats()
     }
 
 @app.get("/protected")
-def protected_route(token: str = Depends(oauth2_scheme)):
-    username = auth.decode_token(token)
-    if not username:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    return {"msg": f"Hello, {username}! You accessed a protected route."}
+def protected_route(user: CurrentUser = Depends(current_user)):
+    return {"msg": f"Hello, {user.username}! You accessed a protected route."}
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,132 @@
+import hashlib
+import mmap
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from io import BytesIO
+
+# Relative paths are anchored at the repo root, so the app, the migration and the GC script
+# use the same directory whichever directory they are started from
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BLOB_STORE_DIR = os.path.join(REPO_ROOT, os.getenv("BLOB_STORE_DIR", "blobs"))
+CHUNK_SIZE = 1024 * 1024
+
+
+class BlobTooLargeError(ValueError):
+    pass
+
+
+class BlobStore:
+    """
+    Content-addressed files on local disk. A blob lives at <root>/<ab>/<cd>/<sha256>, is
+    written once through a temp file and an atomic rename, and identical content is stored
+    only once. Blobs are never rewritten, so readers can map them without locking.
+    Replacing a statement doesn't delete the old blob, since another row may share it;
+    gc_statement_blobs.py removes blobs no row references any more.
+    """
+
+    def __init__(self, root=BLOB_STORE_DIR, chunk_size=CHUNK_SIZE):
+        self.root = root
+        self.chunk_size = chunk_size
+        os.makedirs(os.path.join(root, "tmp"), exist_ok=True)
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def exists(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def size(self, digest):
+        return os.path.getsize(self.path(digest))
+
+    def put_stream(self, stream, max_bytes=None):
+        """
+        Copy a binary file object into the store chunk by chunk, hashing as it goes.
+        Returns (digest, size). Raises BlobTooLargeError once more than `max_bytes` arrive;
+        nothing is kept in that case.
+        """
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.join(self.root, "tmp"))
+        try:
+            with os.fdopen(fd, "wb") as out:
+                while True:
+                    chunk = stream.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if max_bytes is not None and size > max_bytes:
+                        raise BlobTooLargeError(f"Blob exceeds {max_bytes} bytes")
+                    digest.update(chunk)
+                    out.write(chunk)
+            key = digest.hexdigest()
+            path = self.path(key)
+            if os.path.exists(path):
+                os.remove(tmp_path)
+                # A fresh mtime keeps the garbage collector off a blob that is being re-referenced
+                os.utime(path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+            return key, size
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def put_file(self, path, max_bytes=None):
+        with open(path, "rb") as f:
+            return self.put_stream(f, max_bytes)
+
+    def put_bytes(self, data, max_bytes=None):
+        return self.put_stream(BytesIO(data), max_bytes)
+
+    @contextmanager
+    def open(self, digest):
+        """A read-only memory map of the blob; pages are loaded from disk as they are touched."""
+        with open(self.path(digest), "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                yield b""
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                yield view
+
+    def digests(self):
+        """(digest, mtime) of every stored blob."""
+        for dirpath, _, filenames in os.walk(self.root):
+            if os.path.basename(dirpath) == "tmp":
+                continue
+            for name in filenames:
+                if len(name) == 64:
+                    yield name, os.path.getmtime(os.path.join(dirpath, name))
+
+    def sweep(self, referenced, grace_seconds=86400):
+        """
+        Delete blobs whose digest is not in `referenced` and that haven't been written or
+        re-uploaded for `grace_seconds`, so uploads still on their way to a row survive.
+        Returns the number of blobs deleted.
+        """
+        cutoff = time.time() - grace_seconds
+        deleted = 0
+        for digest, mtime in list(self.digests()):
+            if digest not in referenced and mtime < cutoff:
+                self.delete(digest)
+                deleted += 1
+        return deleted
+
+    def delete(self, digest):
+        try:
+            os.remove(self.path(digest))
+        except FileNotFoundError:
+            pass
+
+
+_store = None
+
+
+def get_blob_store():
+    global _store
+    if _store is None:
+        _store = BlobStore()
+    return _store
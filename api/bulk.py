@@ -0,0 +1,299 @@
+import argparse
+import asyncio
+import csv
+import json
+import os
+import shutil
+import time
+import uuid
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import load_only
+import database, models, pipeline, transactions, dashboard, incremental
+from blobstore import get_blob_store
+
+STAGES = ("extract", "clean", "insights", "write")
+
+
+def load_manifest(path):
+    """
+    Read a bulk manifest: either CSV with a header row or a JSON list of objects. Every
+    entry needs a `username`; `statement` names a PDF in the statements directory and the
+    remaining keys are the same form fields /submit-financial-info accepts.
+    """
+    if path.endswith(".json"):
+        with open(path, "r") as f:
+            items = json.load(f)
+    else:
+        with open(path, "r", newline="") as f:
+            items = list(csv.DictReader(f))
+    if not isinstance(items, list):
+        raise ValueError("Manifest must be a list of entries")
+    for i, item in enumerate(items):
+        if not isinstance(item, dict) or not item.get("username"):
+            raise ValueError(f"Manifest entry {i} has no username")
+    return items
+
+
+def statement_path(statements_dir, statement):
+    """Path of a manifest's statement file; it must resolve to somewhere inside `statements_dir`."""
+    root = os.path.realpath(statements_dir)
+    path = os.path.realpath(os.path.join(root, statement))
+    if os.path.commonpath([root, path]) != root:
+        raise ValueError(f"Statement {statement!r} is outside the statements directory")
+    return path
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct * (len(ordered) - 1))))]
+
+
+class BulkReport:
+    def __init__(self, total):
+        self.total = total
+        self.succeeded = 0
+        self.failed = []
+        self.latencies = {stage: [] for stage in STAGES}
+        self.started = time.monotonic()
+        self.finished = None
+
+    def record(self, stage, seconds):
+        self.latencies[stage].append(seconds)
+
+    def to_dict(self):
+        elapsed = (self.finished or time.monotonic()) - self.started
+        done = self.succeeded + len(self.failed)
+        return {
+            "total": self.total,
+            "succeeded": self.succeeded,
+            "failed": len(self.failed),
+            "errors": self.failed[:50],
+            "elapsed_seconds": round(elapsed, 3),
+            "statements_per_minute": round(done / elapsed * 60, 2) if elapsed > 0 else 0.0,
+            "stage_latency_seconds": {
+                stage: {
+                    "p50": percentile(samples, 0.50),
+                    "p95": percentile(samples, 0.95),
+                    "p99": percentile(samples, 0.99),
+                    "count": len(samples),
+                }
+                for stage, samples in self.latencies.items()
+            },
+        }
+
+
+async def ingest_one(item, user_id, statements_dir, report):
+    """Extract, clean and analyse one manifest entry into a FinancialData row that is not yet in a session."""
+    financial_data = models.FinancialData(user_id=user_id)
+    for field in pipeline.FORM_FIELDS:
+        setattr(financial_data, field, str(item.get(field) or ""))
+
+    started = time.monotonic()
+    pdf_text = ""
+    statement = item.get("statement")
+    if statement:
+        path = statement_path(statements_dir, statement)
+        if os.path.getsize(path) > pipeline.MAX_PDF_BYTES:
+            raise pipeline.PdfTooLargeError(f"{statement} exceeds {pipeline.MAX_PDF_BYTES} bytes")
+        store = get_blob_store()
+        digest, size = await run_in_threadpool(store.put_file, path, pipeline.MAX_PDF_BYTES)
+        financial_data.statement_digest, financial_data.statement_size = digest, size
+        pdf_text = await pipeline.extract_statement_text(store.path(digest), digest)
+    report.record("extract", time.monotonic() - started)
+
+    started = time.monotonic()
+    ai_analysis = await pipeline.clean_statement(financial_data, pdf_text, financial_data.statement_digest)
+    cleaned_data = pipeline.apply_cleaned_data(financial_data, ai_analysis)
+    report.record("clean", time.monotonic() - started)
+
+    # The plan is left empty; /get-financial-data generates it on first dashboard load
+    started = time.monotonic()
+    insights_data = await pipeline.generate_financial_insights(
+        cleaned_data, financial_data, include_plan=False
+    )
+    if not insights_data.get("insights_generated"):
+        # Counted as a failed entry, so the user's existing analysis isn't overwritten by a placeholder
+        raise pipeline.StageError(f"Insights generation failed: {insights_data.get('error')}")
+    pipeline.apply_insights(financial_data, insights_data)
+    financial_data.credit_improvement_plan = ""
+    financial_data.is_plan_generated = False
+    report.record("insights", time.monotonic() - started)
+
+    return {
+        column.name: getattr(financial_data, column.name)
+        for column in models.FinancialData.__table__.columns
+        if column.name != "id" and getattr(financial_data, column.name) is not None
+    }
+
+
+def update_analysis_state(db, row):
+    """Fold the entry's purchases into the user's AnalysisState, so the next submission diffs against them."""
+    if not incremental.INCREMENTAL_ANALYSIS:
+        return
+    state = incremental.get_state(db, row["user_id"])
+    form = {field: row.get(field) for field in pipeline.FORM_FIELDS}
+    try:
+        incremental.update_state(db, state, json.loads(row["ai_analysis_result"]), form)
+    except Exception as e:
+        print(f"Error updating analysis state for {row.get('username')}: {e}")
+
+
+def write_batch(session_factory, rows):
+    """
+    Upsert one FinancialData row, its transactions, analysis state and dashboard document
+    per user in a single transaction.
+    """
+    db = session_factory()
+    try:
+        user_ids = {row["user_id"] for row in rows}
+        existing = {
+            fd.user_id: fd
+            for fd in (
+                db.query(models.FinancialData)
+                .options(load_only(models.FinancialData.id, models.FinancialData.user_id))
+                .filter(models.FinancialData.user_id.in_(user_ids))
+            )
+        }
+        for row in rows:
+            financial_data = existing.get(row["user_id"])
+            if financial_data is None:
+                financial_data = models.FinancialData(user_id=row["user_id"])
+                db.add(financial_data)
+                existing[row["user_id"]] = financial_data
+            for column, value in row.items():
+                if column != "username":
+                    setattr(financial_data, column, value)
+        db.flush()
+        # A user listed twice in one batch keeps the transactions of the later entry, like the row itself
+        purchases = {row["user_id"]: json.loads(row.get("cleaned_transaction_list") or "[]") for row in rows}
+        transactions.replace_transactions(db, [
+            (user_id, existing[user_id].id, user_purchases) for user_id, user_purchases in purchases.items()
+        ])
+        for row in rows:
+            update_analysis_state(db, row)
+        for user_id in purchases:
+            dashboard.refresh_dashboard(db, user_id)
+        db.commit()
+    finally:
+        db.close()
+
+
+async def run_bulk_ingest(items, statements_dir, concurrency=8, batch_size=50, session_factory=None):
+    """
+    Ingest many users' statements with at most `concurrency` analyses in flight against
+    the shared Martian client, writing results back `batch_size` rows per transaction.
+    """
+    session_factory = session_factory or database.SessionLocal
+    report = BulkReport(len(items))
+
+    db = session_factory()
+    try:
+        usernames = {item["username"] for item in items}
+        user_ids = dict(
+            db.query(models.User.username, models.User.id).filter(models.User.username.in_(usernames)).all()
+        )
+    finally:
+        db.close()
+
+    semaphore = asyncio.Semaphore(concurrency)
+    pending_rows = []
+
+    async def flush():
+        nonlocal pending_rows
+        if not pending_rows:
+            return
+        rows, pending_rows = pending_rows, []
+        started = time.monotonic()
+        try:
+            await run_in_threadpool(write_batch, session_factory, rows)
+        except Exception as e:
+            report.succeeded -= len(rows)
+            report.failed.extend({"username": row.get("username"), "error": f"write: {e}"} for row in rows)
+        report.record("write", time.monotonic() - started)
+
+    async def process(item):
+        username = item["username"]
+        user_id = user_ids.get(username)
+        if user_id is None:
+            report.failed.append({"username": username, "error": "user not found"})
+            return
+        async with semaphore:
+            try:
+                row = await ingest_one(item, user_id, statements_dir, report)
+            except Exception as e:
+                report.failed.append({"username": username, "error": str(e)})
+                return
+        report.succeeded += 1
+        pending_rows.append(dict(row, username=username))
+        if len(pending_rows) >= batch_size:
+            await flush()
+
+    await asyncio.gather(*(process(item) for item in items))
+    await flush()
+    report.finished = time.monotonic()
+    return report.to_dict()
+
+
+# Bulk runs started through the API, kept in memory for /bulk-runs/{run_id} until they have
+# been finished for BULK_RUN_TTL_SECONDS
+BULK_RUN_TTL_SECONDS = float(os.getenv("BULK_RUN_TTL_SECONDS", "86400"))
+bulk_runs = {}
+
+
+def evict_finished_runs(now=None):
+    now = time.monotonic() if now is None else now
+    expired = [
+        run_id for run_id, run in bulk_runs.items()
+        if run.get("finished_at") is not None and now - run["finished_at"] > BULK_RUN_TTL_SECONDS
+    ]
+    for run_id in expired:
+        del bulk_runs[run_id]
+
+
+def start_bulk_run(manifest_path, statements_dir, concurrency=8, batch_size=50, cleanup_dir=None):
+    evict_finished_runs()
+    run_id = uuid.uuid4().hex
+    items = load_manifest(manifest_path)
+
+    async def runner():
+        try:
+            report = await run_bulk_ingest(items, statements_dir, concurrency, batch_size)
+            bulk_runs[run_id].update(status="finished", report=report)
+        except Exception as e:
+            bulk_runs[run_id].update(status="failed", error=str(e))
+        finally:
+            bulk_runs[run_id]["finished_at"] = time.monotonic()
+            if cleanup_dir:
+                shutil.rmtree(cleanup_dir, ignore_errors=True)
+
+    bulk_runs[run_id] = {"run_id": run_id, "status": "running", "total": len(items)}
+    bulk_runs[run_id]["task"] = asyncio.create_task(runner())
+    return run_id
+
+
+def describe_run(run_id):
+    evict_finished_runs()
+    run = bulk_runs.get(run_id)
+    if run is None:
+        return None
+    return {key: value for key, value in run.items() if key not in ("task", "finished_at")}
+
+
+async def _main(args):
+    items = load_manifest(args.manifest)
+    try:
+        report = await run_bulk_ingest(items, args.dir, args.concurrency, args.batch_size)
+    finally:
+        await pipeline.close_martian_client()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-ingest credit card statements for many users")
+    parser.add_argument("--dir", required=True, help="directory holding the statement PDFs")
+    parser.add_argument("--manifest", required=True, help="CSV or JSON manifest of users and form fields")
+    parser.add_argument("--concurrency", type=int, default=8, help="maximum analyses in flight")
+    parser.add_argument("--batch-size", type=int, default=50, help="rows per database transaction")
+    asyncio.run(_main(parser.parse_args()))
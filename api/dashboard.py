@@ -0,0 +1,184 @@
+import gzip
+import hashlib
+import json
+from datetime import datetime
+from fastapi import HTTPException
+from fastapi.responses import Response
+from sqlalchemy.orm import undefer_group
+import models
+
+# /get-financial-data is served from a per-user document that is serialized (and gzipped)
+# when the analysis changes, not on every poll. Its sha256 is a strong ETag, so a client
+# re-sending it in If-None-Match gets a 304 without the document being read at all.
+CACHE_CONTROL = "private, no-cache"
+
+
+def load_financial_dashboard(db, user_id):
+    """Everything the dashboard returns in one query; has_pdf is computed in SQL."""
+    return (
+        db.query(models.FinancialData)
+        .options(undefer_group("ai_raw"))
+        .filter(models.FinancialData.user_id == user_id)
+        .first()
+    )
+
+
+def plan_ready(credit_plan):
+    return credit_plan not in (None, "", "{}")
+
+
+def build_document(financial_data):
+    return {
+        "raw_data": {
+            "credit_card_limit": financial_data.credit_card_limit,
+            "card_age": financial_data.card_age,
+            "credit_forms": financial_data.credit_forms,
+            "current_debt": financial_data.current_debt,
+            "debt_amount": financial_data.debt_amount,
+            "debt_end_date": financial_data.debt_end_date,
+            "debt_duration": financial_data.debt_duration,
+            "has_pdf": financial_data.has_pdf
+        },
+        "cleaned_data": {
+            "cleaned_card_limit": financial_data.cleaned_card_limit,
+            "cleaned_card_age": financial_data.cleaned_card_age,
+            "cleaned_transaction_list": financial_data.cleaned_transaction_list,
+            "cleaned_debt_history": financial_data.cleaned_debt_history,
+            "ai_analysis_result": financial_data.ai_analysis_result,
+            "is_data_cleaned": financial_data.is_data_cleaned
+        },
+        "insights": {
+            "financial_metrics": financial_data.financial_metrics,
+            "insights": financial_data.insights,
+            "recommendations": financial_data.recommendations,
+            "risk_assessment": financial_data.risk_assessment,
+            "trends": financial_data.trends,
+            "custom_credit_score": financial_data.custom_credit_score,
+            "credit_improvement_plan": financial_data.credit_improvement_plan if plan_ready(financial_data.credit_improvement_plan) else "{}",
+            "ai_insights_text": financial_data.ai_insights_text,
+            "ai_insights_result": financial_data.ai_insights_result,
+            "is_insights_generated": financial_data.is_insights_generated,
+            "is_plan_generated": financial_data.is_plan_generated
+        }
+    }
+
+
+def serialize(document):
+    return json.dumps(document, separators=(",", ":")).encode("utf-8")
+
+
+def get_document(db, user_id):
+    """The stored document's version, ETag and plan flag; the bodies are only loaded when sent."""
+    return db.query(models.DashboardDocument).filter(models.DashboardDocument.user_id == user_id).first()
+
+
+def load_document(db, user_id):
+    """The stored document, built on first use. None if the user has no financial data."""
+    document = get_document(db, user_id)
+    if document is None:
+        document = refresh_dashboard(db, user_id)
+        if document is None:
+            return None
+        db.commit()
+        # Reload what the endpoint checks before the body is sent; the bodies stay deferred
+        db.refresh(document, ["version", "etag", "plan_ready"])
+    return document
+
+
+def refresh_dashboard(db, user_id, financial_data=None):
+    """
+    Rebuild the user's dashboard document from FinancialData, bumping its version only if
+    the content changed. Returns the document, or None if the user has no financial data.
+    The caller commits.
+    """
+    financial_data = financial_data if financial_data is not None else load_financial_dashboard(db, user_id)
+    if financial_data is None:
+        return None
+    body = serialize(build_document(financial_data))
+    etag = hashlib.sha256(body).hexdigest()
+    document = get_document(db, user_id)
+    if document is not None and document.etag == etag:
+        return document
+    if document is None:
+        document = models.DashboardDocument(user_id=user_id, version=0)
+        db.add(document)
+    document.version = (document.version or 0) + 1
+    document.etag = etag
+    document.plan_ready = plan_ready(financial_data.credit_improvement_plan)
+    document.document = body.decode("utf-8")
+    document.document_gzip = gzip.compress(body)
+    document.updated_at = datetime.utcnow()
+    return document
+
+
+def project(document, fields):
+    """
+    Keep only the comma-separated `fields`: a section ("insights") or one key in a section
+    ("insights.credit_improvement_plan"). Raises HTTPException 400 for unknown names.
+    """
+    projected = {}
+    for field in (f.strip() for f in fields.split(",")):
+        if not field:
+            continue
+        section, _, key = field.partition(".")
+        if section not in document or (key and key not in document[section]):
+            raise HTTPException(status_code=400, detail=f"Unknown field: {field}")
+        if key:
+            projected.setdefault(section, {})[key] = document[section][key]
+        else:
+            projected[section] = document[section]
+    return projected
+
+
+def _matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # If-None-Match uses the weak comparison, so a W/ prefix added by a proxy still matches
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def dashboard_response(document, request, fields=None, plan_pending=False):
+    """
+    The document as JSON with a strong ETag, honouring If-None-Match and gzip. Projections
+    and the gzip encoding are separate representations, so each gets its own ETag. While a
+    plan is still being generated the response is a 202 with "plan_pending": true and is
+    not cacheable, since it is about to change.
+    """
+    wants_gzip = "gzip" in request.headers.get("accept-encoding", "")
+    headers = {
+        "Cache-Control": CACHE_CONTROL,
+        "Vary": "Accept-Encoding, Authorization",
+        "X-Dashboard-Version": str(document.version)
+    }
+    if wants_gzip:
+        headers["Content-Encoding"] = "gzip"
+
+    if plan_pending:
+        headers["Cache-Control"] = "no-store"
+        pending = project(json.loads(document.document), fields) if fields else json.loads(document.document)
+        pending["plan_pending"] = True
+        body = serialize(pending)
+        return Response(
+            content=gzip.compress(body) if wants_gzip else body,
+            status_code=202, media_type="application/json", headers=headers
+        )
+
+    tag = document.etag
+    if fields:
+        tag += "-" + hashlib.sha256(fields.encode("utf-8")).hexdigest()[:16]
+    if wants_gzip:
+        tag += "-gzip"
+    etag = f'"{tag}"'
+    headers["ETag"] = etag
+    if _matches(request.headers.get("if-none-match"), etag):
+        headers.pop("Content-Encoding", None)
+        return Response(status_code=304, headers=headers)
+
+    if fields:
+        body = serialize(project(json.loads(document.document), fields))
+        if wants_gzip:
+            body = gzip.compress(body)
+    else:
+        body = document.document_gzip if wants_gzip else document.document.encode("utf-8")
+    return Response(content=body, media_type="application/json", headers=headers)
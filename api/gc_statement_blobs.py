@@ -0,0 +1,34 @@
+"""
+Delete statement PDFs from the blob store that no financial_data row references any more,
+e.g. after users replaced their statement. Blobs written or re-uploaded within the grace
+period are kept, so an upload whose row hasn't been committed yet is never removed.
+
+    python api/gc_statement_blobs.py [--grace-hours 24] [--dry-run]
+"""
+import argparse
+from sqlalchemy import text
+import database
+from blobstore import get_blob_store
+
+
+def referenced_digests(engine):
+    with engine.connect() as conn:
+        return set(conn.execute(
+            text("SELECT DISTINCT statement_digest FROM financial_data WHERE statement_digest IS NOT NULL")
+        ).scalars())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Remove unreferenced statement PDFs from the blob store")
+    parser.add_argument("--grace-hours", type=float, default=24, help="keep blobs touched more recently than this")
+    parser.add_argument("--dry-run", action="store_true", help="only report how many blobs are unreferenced")
+    args = parser.parse_args()
+
+    store = get_blob_store()
+    referenced = referenced_digests(database.engine)
+    if args.dry_run:
+        unreferenced = sum(1 for digest, _ in store.digests() if digest not in referenced)
+        print(f"{unreferenced} unreferenced blobs in {store.root}")
+    else:
+        deleted = store.sweep(referenced, args.grace_hours * 3600)
+        print(f"Deleted {deleted} unreferenced blobs from {store.root}")
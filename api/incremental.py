@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import sys
+from datetime import datetime
+import numpy as np
+import models, transactions
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dataInput import TransactionFrame, cardData
+from anomalyDetector import AnomalyDetector
+from criteria import critera
+import analytics
+
+# Per-user aggregates kept between submissions in the analysis_states table. A resubmission
+# that only appends purchases to the stored ones folds just the new purchases into the
+# running sums and anomaly detector; the insights and plan LLM calls are skipped unless the
+# derived metrics moved materially since the last time they ran.
+INCREMENTAL_ANALYSIS = os.getenv("INCREMENTAL_ANALYSIS", "true").lower() == "true"
+REANALYSIS_UTILIZATION_DELTA = float(os.getenv("REANALYSIS_UTILIZATION_DELTA", "0.02"))
+REANALYSIS_SPEND_DELTA = float(os.getenv("REANALYSIS_SPEND_DELTA", "0.05"))
+_stats = {"reanalyses_skipped": 0, "anomaly_rebuilds": 0}
+
+
+def incremental_stats():
+    return dict(_stats, enabled=INCREMENTAL_ANALYSIS)
+
+
+def purchases_digest(purchases):
+    return hashlib.sha256(json.dumps(purchases, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def monthly_totals_of(frame: TransactionFrame):
+    """Spending in cents per "YYYY-MM" key."""
+    keys = frame.purchaseYear * 100 + frame.purchaseMonth
+    months, inverse = np.unique(keys, return_inverse=True)
+    totals = np.bincount(inverse, weights=frame.costCents, minlength=len(months))
+    return {f"{key // 100}-{key % 100:02d}": int(total) for key, total in zip(months.tolist(), totals.tolist())}
+
+
+def get_state(db, user_id):
+    state = db.query(models.AnalysisState).filter(models.AnalysisState.user_id == user_id).first()
+    if state is None:
+        state = models.AnalysisState(user_id=user_id)
+        db.add(state)
+    return state
+
+
+def spending_trend(monthly_totals):
+    """Latest month against the average of up to three months before it."""
+    months = sorted(monthly_totals)
+    if len(months) < 2:
+        return "insufficient_data"
+    previous = [monthly_totals[m] for m in months[-4:-1]]
+    baseline = sum(previous) / len(previous)
+    latest = monthly_totals[months[-1]]
+    if latest > baseline * 1.1:
+        return "increasing"
+    if latest < baseline * 0.9:
+        return "decreasing"
+    return "stable"
+
+
+def update_state(db, state, cleaned_data, form):
+    """
+    Fold `cleaned_data["purchases"]` into the state and return the derived metrics. When the
+    stored purchases are an unchanged prefix of the list, only the appended purchases are
+    parsed and added to the running sums, monthly totals and anomaly detector (which also
+    needs them dated on or after everything it has seen); any other change recomputes the
+    state from the full list. The median comes from the transactions table, which the caller
+    has already replaced with these purchases.
+    """
+    purchases = cleaned_data.get("purchases", [])
+    stored = state.transaction_count or 0
+    appended = (
+        state.purchases_digest is not None and stored <= len(purchases)
+        and purchases_digest(purchases[:stored]) == state.purchases_digest
+    )
+    if appended:
+        new = TransactionFrame.fromPurchases(purchases[stored:])
+        total_cents = (state.total_cents or 0) + int(new.costCents.sum())
+        unpaid_cents = (state.unpaid_cents or 0) + int(new.costCents[new.unpaid].sum())
+        monthly_totals = json.loads(state.monthly_totals or "{}")
+        for key, cents in monthly_totals_of(new).items():
+            monthly_totals[key] = monthly_totals.get(key, 0) + cents
+        latest_purchase = max(state.latest_purchase or 0, int(new.purchaseKey().max()) if len(new) else 0)
+    else:
+        new = TransactionFrame.fromPurchases(purchases)
+        total_cents = int(new.costCents.sum())
+        unpaid_cents = int(new.costCents[new.unpaid].sum())
+        monthly_totals = monthly_totals_of(new)
+        latest_purchase = int(new.purchaseKey().max()) if len(new) else 0
+
+    in_order = (
+        appended and state.anomaly_state is not None
+        and (len(new) == 0 or int(new.purchaseKey().min()) >= (state.latest_purchase or 0))
+    )
+    if in_order:
+        detector = AnomalyDetector.from_dict(json.loads(state.anomaly_state))
+        anomaly_count = (state.anomaly_count or 0) + len(analytics.detect_anomalies(new, detector))
+    else:
+        detector = AnomalyDetector()
+        frame = new if not appended else TransactionFrame.fromPurchases(purchases)
+        anomaly_count = len(analytics.detect_anomalies(frame, detector))
+        _stats["anomaly_rebuilds"] += 1
+
+    card_limit = float(cleaned_data.get("card_limit") or 0)
+    card_age = int(cleaned_data.get("card_age") or 0)
+    n = len(purchases)
+    utilization = unpaid_cents / 100 / card_limit if card_limit > 0 and n else 0.0
+    # Same credit score code compute_algorithm_results derives from utilization and card age
+    card = cardData(cardLimit=card_limit, transactionList=None, ageOfCard=card_age)
+    card.percentageUsed = utilization
+
+    state.purchases_digest = purchases_digest(purchases)
+    state.transaction_count = n
+    state.total_cents = total_cents
+    state.unpaid_cents = unpaid_cents
+    state.utilization = utilization
+    state.monthly_totals = json.dumps(monthly_totals)
+    state.latest_purchase = latest_purchase
+    state.anomaly_state = json.dumps(detector.to_dict())
+    state.anomaly_count = anomaly_count
+
+    form_text = json.dumps([form, cleaned_data.get("debt_history", [])], sort_keys=True, default=str)
+    metrics = {
+        "transaction_count": n,
+        "total_spent": total_cents / 100,
+        "unpaid_total": unpaid_cents / 100,
+        "median_amount": transactions.median_amount(db, state.user_id),
+        "utilization": utilization,
+        "score_code": critera(card).messageReturnCodedName(),
+        "anomaly_count": anomaly_count,
+        "spending_trend": spending_trend(monthly_totals),
+        "inputs_digest": hashlib.sha256(form_text.encode("utf-8")).hexdigest()
+    }
+    state.metrics = json.dumps(metrics)
+    state.updated_at = datetime.utcnow()
+    return metrics
+
+
+def _relative_change(old, new):
+    return abs(new - old) / max(abs(old), 1.0)
+
+
+def metrics_changed(old, new):
+    """Whether `new` differs enough from the metrics the current insights were generated from."""
+    if not old:
+        return True
+    for key in ("score_code", "anomaly_count", "spending_trend", "inputs_digest"):
+        if old.get(key) != new.get(key):
+            return True
+    if abs(new["utilization"] - old["utilization"]) >= REANALYSIS_UTILIZATION_DELTA:
+        return True
+    return any(
+        _relative_change(old[key], new[key]) >= REANALYSIS_SPEND_DELTA
+        for key in ("total_spent", "unpaid_total", "median_amount")
+    )
+
+
+def needs_reanalysis(state, financial_data):
+    """False only when the stored insights and plan still describe the current metrics."""
+    if not INCREMENTAL_ANALYSIS:
+        return True
+    has_outputs = (
+        financial_data.is_insights_generated and financial_data.is_plan_generated
+        and financial_data.credit_improvement_plan not in (None, "", "{}")
+    )
+    old = json.loads(state.analyzed_metrics) if state.analyzed_metrics else None
+    if not has_outputs or metrics_changed(old, json.loads(state.metrics or "{}")):
+        return True
+    _stats["reanalyses_skipped"] += 1
+    return False
+
+
+def mark_analyzed(state):
+    """Record the current metrics as the baseline later submissions are compared against."""
+    state.analyzed_metrics = state.metrics
@@ -0,0 +1,232 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import update, and_, or_, func
+import database, models
+
+ACTIVE_STATUSES = ("queued", "running")
+# A running job whose worker hasn't renewed its lease for this long is assumed dead; the
+# worker renews it every third of that while a stage runs
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "900"))
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue has no room for another submission."""
+
+
+class JobQueue:
+    """
+    In-process queue that runs statement analysis jobs on a bounded pool of asyncio workers.
+    Job state lives in the analysis_jobs table: every finished stage is committed with its
+    timing, and jobs still queued at startup, or running under a lapsed lease, are picked
+    up again and resume after the last completed stage. A worker claims a job with a
+    conditional UPDATE before running it, so with several app processes each job runs once.
+    Session calls go through the threadpool to keep the event loop free.
+    """
+
+    def __init__(self, stages, workers=4, max_queued=1000, session_factory=None):
+        self.stages = stages
+        self.workers = workers
+        self.max_queued = max_queued
+        self.session_factory = session_factory or database.SessionLocal
+        self._queue = None
+        self._tasks = []
+
+    @property
+    def stage_names(self):
+        return [name for name, _ in self.stages]
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queued)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        pending = await run_in_threadpool(self._claimable_jobs)
+        for job_id in pending:
+            await self._queue.put(job_id)
+        if pending:
+            print(f"Resuming {len(pending)} unfinished analysis jobs")
+
+    def _claimable_jobs(self):
+        db = self.session_factory()
+        try:
+            pending = (
+                db.query(models.AnalysisJob.id)
+                .filter(self._claimable())
+                .order_by(models.AnalysisJob.created_at)
+                .all()
+            )
+        finally:
+            db.close()
+        return [job_id for (job_id,) in pending]
+
+    def _claimable(self):
+        lapsed = datetime.utcnow() - timedelta(seconds=JOB_LEASE_SECONDS)
+        return or_(
+            models.AnalysisJob.status == "queued",
+            and_(
+                models.AnalysisJob.status == "running",
+                or_(models.AnalysisJob.heartbeat_at.is_(None), models.AnalysisJob.heartbeat_at < lapsed)
+            )
+        )
+
+    def _claim(self, db, job_id):
+        """Atomically mark the job running under this worker's lease; False if someone else has it."""
+        now = datetime.utcnow()
+        claimed = db.execute(
+            update(models.AnalysisJob)
+            .where(models.AnalysisJob.id == job_id, self._claimable())
+            .values(
+                status="running",
+                heartbeat_at=now,
+                attempts=func.coalesce(models.AnalysisJob.attempts, 0) + 1,
+                started_at=func.coalesce(models.AnalysisJob.started_at, now)
+            )
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        return claimed == 1
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def create_job(self, db, user_id, financial_data_id, include_statement):
+        """
+        Persist a queued job and hand it to the workers; returns its id. The insert runs in
+        the threadpool. Raises QueueFullError when saturated; a job whose slot was taken by
+        another submission during the insert is marked failed rather than left queued.
+        """
+        if self._queue is None or self._queue.full():
+            raise QueueFullError("Analysis queue is full")
+        job = models.AnalysisJob(
+            id=uuid.uuid4().hex,
+            user_id=user_id,
+            financial_data_id=financial_data_id,
+            include_statement=include_statement,
+            status="queued",
+        )
+        job_id = job.id
+        await run_in_threadpool(self._insert_job, db, job)
+        try:
+            self._queue.put_nowait(job_id)
+        except asyncio.QueueFull:
+            await run_in_threadpool(self._fail, db, job, "Analysis queue is full")
+            raise QueueFullError("Analysis queue is full")
+        return job_id
+
+    def _insert_job(self, db, job):
+        db.add(job)
+        db.commit()
+
+    def describe(self, job):
+        completed = json.loads(job.completed_stages or "[]")
+        return {
+            "job_id": job.id,
+            "status": job.status,
+            "current_stage": job.current_stage,
+            "completed_stages": completed,
+            "progress": len(completed) / len(self.stages) if self.stages else 1.0,
+            "stage_timings": json.loads(job.stage_timings or "{}"),
+            "error": job.error,
+            "attempts": job.attempts,
+            "created_at": job.created_at.isoformat() if job.created_at else None,
+            "started_at": job.started_at.isoformat() if job.started_at else None,
+            "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        }
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "max_queued": self.max_queued,
+        }
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self.run_job(job_id)
+            except Exception as e:
+                print(f"Job {job_id} crashed outside its stages: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _renew_lease(self, job_id):
+        # Its own session, since the stage may be using the job's session in another thread
+        db = self.session_factory()
+        try:
+            db.execute(
+                update(models.AnalysisJob)
+                .where(models.AnalysisJob.id == job_id, models.AnalysisJob.status == "running")
+                .values(heartbeat_at=datetime.utcnow())
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    async def _keep_lease(self, job_id):
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+            try:
+                await run_in_threadpool(self._renew_lease, job_id)
+            except Exception as e:
+                print(f"Job {job_id} could not renew its lease: {e}")
+
+    async def run_job(self, job_id):
+        db = self.session_factory()
+        # Objects stay loaded across commits, so stages can read them without going back to the database
+        db.expire_on_commit = False
+        try:
+            if not await run_in_threadpool(self._claim, db, job_id):
+                return
+            job = await run_in_threadpool(db.get, models.AnalysisJob, job_id)
+            completed = json.loads(job.completed_stages or "[]")
+            timings = json.loads(job.stage_timings or "{}")
+            
+            context = {}
+            for name, stage in self.stages:
+                if name in completed:
+                    continue
+                job.current_stage = name
+                job.heartbeat_at = datetime.utcnow()
+                await run_in_threadpool(db.commit)
+                started = time.monotonic()
+                lease = asyncio.create_task(self._keep_lease(job_id))
+                try:
+                    await stage(db, job, context)
+                except Exception as e:
+                    await run_in_threadpool(self._fail, db, job, f"{name}: {e}")
+                    print(f"Job {job_id} failed in stage {name}: {e}")
+                    return
+                finally:
+                    lease.cancel()
+                timings[name] = round(time.monotonic() - started, 3)
+                completed.append(name)
+                job.completed_stages = json.dumps(completed)
+                job.stage_timings = json.dumps(timings)
+                await run_in_threadpool(db.commit)
+            
+            job.status = "succeeded"
+            job.current_stage = None
+            job.finished_at = datetime.utcnow()
+            await run_in_threadpool(db.commit)
+        finally:
+            # Cancelled at shutdown mid-commit, close() refuses; that error must not replace
+            # the cancellation, or the worker goes back to the queue and stop() never returns
+            try:
+                await run_in_threadpool(db.close)
+            except Exception as e:
+                print(f"Job {job_id} could not close its session: {e}")
+
+    def _fail(self, db, job, error):
+        db.rollback()
+        job.status = "failed"
+        job.error = error
+        job.finished_at = datetime.utcnow()
+        db.commit()
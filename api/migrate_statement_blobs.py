@@ -0,0 +1,71 @@
+"""
+One-off migration: move statement PDFs out of financial_data.credit_card_statement into
+the blob store. Adds the statement_digest and statement_size columns if they are missing,
+copies each PDF into the store one row at a time, records its digest and size, and
+clears the old column. It can be re-run safely; --drop-column removes the old column once
+every PDF has been moved.
+
+    python api/migrate_statement_blobs.py [--batch-size 50] [--drop-column]
+
+Blobs go to BLOB_STORE_DIR, resolved against the repo root like the app does.
+"""
+import argparse
+from sqlalchemy import inspect, text
+import database
+from blobstore import get_blob_store
+
+
+def add_statement_columns(engine):
+    columns = {column["name"] for column in inspect(engine).get_columns("financial_data")}
+    with engine.begin() as conn:
+        if "statement_digest" not in columns:
+            conn.execute(text("ALTER TABLE financial_data ADD COLUMN statement_digest VARCHAR(64)"))
+        if "statement_size" not in columns:
+            conn.execute(text("ALTER TABLE financial_data ADD COLUMN statement_size BIGINT"))
+    return "credit_card_statement" in columns
+
+
+def move_statements(engine, store, batch_size=50):
+    """Copy PDFs into the store, committing every `batch_size` rows. Returns how many moved."""
+    moved = 0
+    while True:
+        with engine.begin() as conn:
+            ids = conn.execute(
+                text("SELECT id FROM financial_data WHERE credit_card_statement IS NOT NULL ORDER BY id LIMIT :limit"),
+                {"limit": batch_size}
+            ).scalars().all()
+            if not ids:
+                return moved
+            for row_id in ids:
+                # One PDF in memory at a time
+                data = conn.execute(
+                    text("SELECT credit_card_statement FROM financial_data WHERE id = :id"), {"id": row_id}
+                ).scalar()
+                digest, size = store.put_bytes(bytes(data))
+                conn.execute(
+                    text(
+                        "UPDATE financial_data SET statement_digest = :digest, statement_size = :size, "
+                        "credit_card_statement = NULL WHERE id = :id"
+                    ),
+                    {"digest": digest, "size": size, "id": row_id}
+                )
+                moved += 1
+        print(f"Moved {moved} statements")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move statement PDFs from financial_data into the blob store")
+    parser.add_argument("--batch-size", type=int, default=50, help="rows per database transaction")
+    parser.add_argument("--drop-column", action="store_true", help="drop credit_card_statement afterwards")
+    args = parser.parse_args()
+
+    engine = database.engine
+    if not add_statement_columns(engine):
+        print("financial_data has no credit_card_statement column, nothing to move")
+    else:
+        moved = move_statements(engine, get_blob_store(), args.batch_size)
+        print(f"Done, {moved} statements moved to {get_blob_store().root}")
+        if args.drop_column:
+            with engine.begin() as conn:
+                conn.execute(text("ALTER TABLE financial_data DROP COLUMN credit_card_statement"))
+            print("Dropped financial_data.credit_card_statement")
@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, LargeBinary, Boolean
-from sqlalchemy.orm import relationship
+from datetime import datetime
+from sqlalchemy import Column, Integer, BigInteger, Float, String, Text, ForeignKey, LargeBinary, Boolean, Date, DateTime, Index
+from sqlalchemy.orm import relationship, deferred, column_property
 from database import Base
 
 class User(Base):
@@ -16,7 +17,10 @@ class FinancialData(Base):
     
     credit_card_limit = Column(String)
     card_age = Column(String)
-    credit_card_statement = Column(LargeBinary)
+    # The statement PDF lives in the blob store (api/blobstore.py), addressed by its sha256
+    statement_digest = Column(String(64))
+    statement_size = Column(BigInteger)
+    has_pdf = column_property(statement_digest.isnot(None))
     credit_forms = Column(Text)
     current_debt = Column(String)
     debt_amount = Column(String)
@@ -25,9 +29,10 @@ class FinancialData(Base):
     
     cleaned_card_limit = Column(String)
     cleaned_card_age = Column(String)
-    cleaned_transaction_list = Column(Text)
+    # The full model responses are only loaded when accessed
+    cleaned_transaction_list = deferred(Column(Text), group="ai_raw")
     cleaned_debt_history = Column(Text)
-    ai_analysis_result = Column(Text)
+    ai_analysis_result = deferred(Column(Text), group="ai_raw")
     is_data_cleaned = Column(Boolean, default=False)
     
     financial_metrics = Column(Text)
@@ -38,8 +43,78 @@ class FinancialData(Base):
     custom_credit_score = Column(Text)
     credit_improvement_plan = Column(Text)
     ai_insights_text = Column(Text)
-    ai_insights_result = Column(Text)
+    ai_insights_result = deferred(Column(Text), group="ai_raw")
     is_insights_generated = Column(Boolean, default=False)
     is_plan_generated = Column(Boolean, default=False)
     
-    user = relationship("User", back_populates="financial_data")
\ No newline at end of file
+    user = relationship("User", back_populates="financial_data")
+
+class DashboardDocument(Base):
+    __tablename__ = "dashboard_documents"
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), unique=True, index=True)
+    
+    version = Column(Integer, default=0)
+    etag = Column(String(64))
+    plan_ready = Column(Boolean, default=False)
+    document = deferred(Column(Text))
+    document_gzip = deferred(Column(LargeBinary))
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class Transaction(Base):
+    __tablename__ = "transactions"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    financial_data_id = Column(Integer, ForeignKey("financial_data.id"))
+    position = Column(Integer)
+    
+    purchase_date = Column(Date)
+    payment_date = Column(Date)
+    amount_cents = Column(BigInteger, nullable=False)
+    unpaid = Column(Boolean, nullable=False)
+    
+    __table_args__ = (
+        Index("ix_transactions_user_purchase_date", "user_id", "purchase_date"),
+        Index("ix_transactions_user_unpaid", "user_id", "unpaid"),
+    )
+
+class AnalysisJob(Base):
+    __tablename__ = "analysis_jobs"
+    id = Column(String(32), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    financial_data_id = Column(Integer, ForeignKey("financial_data.id"))
+    
+    status = Column(String, default="queued", index=True)
+    current_stage = Column(String)
+    completed_stages = Column(Text, default="[]")
+    stage_timings = Column(Text, default="{}")
+    include_statement = Column(Boolean, default=False)
+    pdf_text = Column(Text)
+    error = Column(Text)
+    attempts = Column(Integer, default=0)
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    # Renewed by the worker running the job; a job whose lease lapsed can be claimed again
+    heartbeat_at = Column(DateTime)
+
+class AnalysisState(Base):
+    __tablename__ = "analysis_states"
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), unique=True, index=True)
+    
+    # Digest of the purchase list the aggregates cover, to spot a resubmission that only appends
+    purchases_digest = Column(String(64))
+    transaction_count = Column(Integer, default=0)
+    total_cents = Column(BigInteger, default=0)
+    unpaid_cents = Column(BigInteger, default=0)
+    utilization = Column(Float, default=0.0)
+    monthly_totals = Column(Text, default="{}")
+    latest_purchase = Column(Integer, default=0)
+    anomaly_state = Column(Text)
+    anomaly_count = Column(Integer, default=0)
+    
+    metrics = Column(Text, default="{}")
+    analyzed_metrics = Column(Text)
+    updated_at = Column(DateTime, default=datetime.utcnow)
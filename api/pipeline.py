@@ -0,0 +1,772 @@
+import os
+import sys
+import re
+import json
+import asyncio
+import hashlib
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import undefer_group
+import database, models, incremental, transactions, dashboard
+from blobstore import get_blob_store, REPO_ROOT
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from martianAPIWrapper import AsyncMartianClient, CircuitBreaker, RetryPolicy
+from responseCache import ResponseCache
+from pdfToText import extract_pdf_text, shutdown_pdf_pool, PdfTooLargeError, MAX_PDF_BYTES
+from statementParser import parse_statement
+from dataInput import transactionData, date, cardData, TransactionFrame
+from criteria import critera
+import analytics
+
+# One pooled Martian client per process; connections are reused across requests.
+_martian_client = None
+
+def get_martian_client():
+    global _martian_client
+    if _martian_client is None:
+        api_key = os.getenv("MARTIAN_API_KEY")
+        if not api_key:
+            raise HTTPException(status_code=500, detail="Martian API key not configured")
+        cache = None
+        if os.getenv("MARTIAN_CACHE", "false").lower() == "true":
+            cache = ResponseCache(
+                max_entries=int(os.getenv("MARTIAN_CACHE_MAX_ENTRIES", "1024")),
+                ttl=float(os.getenv("MARTIAN_CACHE_TTL_SECONDS", "86400")),
+                path=os.getenv("MARTIAN_CACHE_PATH", "martian_cache.sqlite3") or None,
+                max_disk_bytes=int(os.getenv("MARTIAN_CACHE_MAX_MB", "256")) * 1024 * 1024,
+            )
+        _martian_client = AsyncMartianClient(
+            api_key,
+            cache=cache,
+            pool_size=int(os.getenv("MARTIAN_POOL_SIZE", "100")),
+            keepalive_expiry=float(os.getenv("MARTIAN_KEEPALIVE_SECONDS", "30")),
+            retry_policy=RetryPolicy(max_retries=int(os.getenv("MARTIAN_MAX_RETRIES", "3"))),
+            circuit_breaker=CircuitBreaker(
+                failure_threshold=int(os.getenv("MARTIAN_BREAKER_THRESHOLD", "5")),
+                reset_timeout=float(os.getenv("MARTIAN_BREAKER_RESET_SECONDS", "30")),
+            ),
+            hedge=os.getenv("MARTIAN_HEDGE", "false").lower() == "true",
+        )
+    return _martian_client
+
+async def close_martian_client():
+    global _martian_client
+    if _martian_client is not None:
+        await _martian_client.aclose()
+        _martian_client = None
+
+def martian_stats():
+    return _martian_client.stats() if _martian_client is not None else None
+
+# Extracted text and cleaned output of statements, keyed on the SHA-256 of the PDF bytes so
+# re-uploading an identical statement skips both extraction and the cleaning call.
+# A relative STATEMENT_CACHE_PATH is resolved against the repo root like the blob store,
+# so the API and the bulk CLI share one cache; an empty value keeps it in memory only.
+STATEMENT_CACHE_PATH = os.getenv("STATEMENT_CACHE_PATH", "statement_cache.sqlite3")
+_statement_cache = None
+
+def get_statement_cache():
+    global _statement_cache
+    if _statement_cache is None and os.getenv("STATEMENT_CACHE", "true").lower() == "true":
+        _statement_cache = ResponseCache(
+            max_entries=int(os.getenv("STATEMENT_CACHE_MAX_ENTRIES", "256")),
+            ttl=float(os.getenv("STATEMENT_CACHE_TTL_SECONDS", str(30 * 86400))),
+            path=os.path.join(REPO_ROOT, STATEMENT_CACHE_PATH) if STATEMENT_CACHE_PATH else None,
+            max_disk_bytes=int(os.getenv("STATEMENT_CACHE_MAX_MB", "128")) * 1024 * 1024,
+        )
+    return _statement_cache
+
+def clear_statement_cache():
+    if get_statement_cache() is not None:
+        _statement_cache.clear()
+
+def statement_cache_stats():
+    return _statement_cache.stats() if _statement_cache is not None else None
+
+def statement_digest(pdf_data):
+    return hashlib.sha256(pdf_data).hexdigest()
+
+async def generate_credit_improvement_plan(financial_metrics, insights, recommendations, risk_assessment, trends, custom_credit_score):
+    try:
+        with open("credit_plan_prompt.txt", "r") as f:
+            plan_prompt = f.read()
+        
+        # Parse all the JSON data
+        import json
+        metrics_data = json.loads(financial_metrics) if financial_metrics else {}
+        insights_data = json.loads(insights) if insights else []
+        recommendations_data = json.loads(recommendations) if recommendations else []
+        risk_data = json.loads(risk_assessment) if risk_assessment else {}
+        trends_data = json.loads(trends) if trends else {}
+        credit_score_data = json.loads(custom_credit_score) if custom_credit_score else {}
+        
+        # Extract algorithm results
+        algorithm_results = credit_score_data.get("algorithm_results", {})
+        
+        comprehensive_data = f"""
+COMPREHENSIVE FINANCIAL ANALYSIS FOR CREDIT IMPROVEMENT PLAN:
+
+FINANCIAL METRICS:
+{json.dumps(metrics_data, indent=2)}
+
+AI INSIGHTS:
+{json.dumps(insights_data, indent=2)}
+
+RECOMMENDATIONS:
+{json.dumps(recommendations_data, indent=2)}
+
+RISK ASSESSMENT:
+{json.dumps(risk_data, indent=2)}
+
+TRENDS ANALYSIS:
+{json.dumps(trends_data, indent=2)}
+
+CUSTOM CREDIT SCORE:
+{json.dumps(credit_score_data, indent=2)}
+
+ALGORITHM ANALYSIS RESULTS:
+Anomaly Detection: {json.dumps(algorithm_results.get("anomalies", []), indent=2)}
+Sorting Analysis: {json.dumps(algorithm_results.get("sorting_stats", {}), indent=2)}
+Search Results: {json.dumps(algorithm_results.get("search_results", {}), indent=2)}
+Greedy Debt Plan: {json.dumps(algorithm_results.get("greedy_debt_plan", []), indent=2)}
+Recursive Trend: {json.dumps(algorithm_results.get("recursive_trend", {}), indent=2)}
+Dynamic Programming: {json.dumps(algorithm_results.get("dynamic_programming", {}), indent=2)}
+Graph Analysis: {json.dumps(algorithm_results.get("graph_analysis", {}), indent=2)}
+Hash Table Analysis: {json.dumps(algorithm_results.get("hash_table", {}), indent=2)}
+Sliding Window: {json.dumps(algorithm_results.get("sliding_window", {}), indent=2)}
+Heap Priority: {json.dumps(algorithm_results.get("heap_priority", {}), indent=2)}
+Backtracking: {json.dumps(algorithm_results.get("backtracking", {}), indent=2)}
+Divide & Conquer: {json.dumps(algorithm_results.get("divide_conquer", {}), indent=2)}
+Two Pointers: {json.dumps(algorithm_results.get("two_pointers", {}), indent=2)}
+
+CREDIT SCORE DETAILS:
+Current Score Code: {credit_score_data.get("score_code", 0)}
+Utilization Ratio: {credit_score_data.get("utilization_ratio", 0)}
+Credit Health Status: {credit_score_data.get("credit_health_status", "Unknown")}
+Card Age: {credit_score_data.get("card_age_months", 0)} months
+Total Transactions: {credit_score_data.get("total_transactions", 0)}
+"""
+        
+        messages = [
+            {"role": "system", "content": plan_prompt},
+            {"role": "user", "content": f"Create a comprehensive credit improvement plan based on this complete financial analysis: {comprehensive_data}"}
+        ]
+        
+        martian_client = get_martian_client()
+        response = await martian_client.chat_completions(
+            model="openai/gpt-4.1-nano:cheap",
+            messages=messages,
+            temperature=0.1
+        )
+        
+        plan_analysis = response.get("choices", [{}])[0].get("message", {}).get("content", "")
+        
+        # Parse the plan JSON
+        print(f"Raw plan_analysis: {plan_analysis[:500]}")  # Debug: print first 500 chars
+        
+        try:
+            plan_json = json.loads(plan_analysis)
+            print(f"Parsed plan_json keys: {plan_json.keys() if isinstance(plan_json, dict) else 'Not a dict'}")
+        except json.JSONDecodeError as json_err:
+            print(f"JSON decode error: {json_err}")
+            print(f"Full response: {plan_analysis}")
+            raise
+        
+        credit_plan = plan_json.get("credit_improvement_plan", {})
+        print(f"Extracted credit_plan keys: {credit_plan.keys() if isinstance(credit_plan, dict) else 'Not a dict'}")
+        
+        return {
+            "credit_improvement_plan": json.dumps(credit_plan),
+            "plan_generated": True,
+            "plan_timestamp": "2024-01-01T00:00:00Z"
+        }
+        
+    except Exception as e:
+        print(f"Error generating credit improvement plan: {e}")
+        import traceback
+        traceback.print_exc()
+        return {
+            "credit_improvement_plan": "{}",
+            "plan_generated": False,
+            "error": str(e)
+        }
+
+def compute_algorithm_results(cleaned_data, financial_data):
+    """CPU-bound half of the insights pipeline; run it off the event loop."""
+    # Columnar transactions straight from the cleaned JSON
+    transaction_frame = TransactionFrame.fromPurchases(cleaned_data.get("purchases", []))
+    
+    card_limit_float = float(cleaned_data.get("card_limit", "0")) if cleaned_data.get("card_limit") else 0.0
+    card_age_int = int(cleaned_data.get("card_age", "0")) if cleaned_data.get("card_age") else 0
+    
+    # Sorting, search, greedy, DP, graph and the other analyses in a few vectorized passes
+    algorithm_results = analytics.analyze(transaction_frame, card_limit_float)
+    
+    # Create cardData object
+    user_card_data = cardData(
+        cardLimit=card_limit_float,
+        transactionList=transaction_frame,
+        ageOfCard=card_age_int
+    )
+    
+    # Organize transactions and calculate utilization
+    user_card_data.organizeDataSet(user_card_data.transactionList)
+    user_card_data.percentageOfCardUsed(user_card_data.transactionList, user_card_data.cardLimit)
+    
+    # Use criteria.py for credit scoring
+    credit_criteria = critera(user_card_data)
+    credit_score_code = credit_criteria.messageReturnCodedName()
+    utilization_ratio = user_card_data.getPercentageUsed()
+    
+    # Map credit score codes to descriptions
+    credit_score_descriptions = {
+        1: "Critical: High utilization + New card - Immediate action needed",
+        2: "Poor: High utilization + Established card - Reduce spending",
+        3: "Fair: Moderate utilization + New card - Build history",
+        4: "Fair: Moderate utilization + Established card - Maintain payments",
+        5: "Good: Low utilization + New card - Keep building history",
+        6: "Excellent: Low utilization + Established card - Perfect credit health"
+    }
+    
+    with open("ai2.prompt", "r") as f:
+        insights_prompt = f.read()
+    
+    analysis_data = f"""
+CLEANED FINANCIAL DATA:
+Card Limit: {cleaned_data.get("card_limit", "")}
+Card Age: {cleaned_data.get("card_age", "")} months
+Purchases: {cleaned_data.get("purchases", [])}
+Debt History: {cleaned_data.get("debt_history", [])}
+
+ALGORITHM ANALYSIS:
+Anomalies Detected: {len(algorithm_results["anomalies"])} transactions unusually large or small for the spending before them
+Sorting Results: {algorithm_results["sorting_stats"]["quicksort_by_amount"]} transactions sorted by amount, {algorithm_results["sorting_stats"]["mergesort_by_date"]} by date
+Search Results: {algorithm_results["search_results"]["unpaid_count"]} unpaid transactions found, median amount: {algorithm_results["search_results"]["median_amount"]}
+Greedy Debt Plan: {len(algorithm_results["greedy_debt_plan"])} optimized payments
+Recursive Trend: {algorithm_results["recursive_trend"]['trend']} pattern detected at depth {algorithm_results["recursive_trend"]['depth']}
+Dynamic Programming: {len(algorithm_results["dynamic_programming"]["optimal_schedule"])} optimal payment schedule items
+Graph Analysis: {algorithm_results["graph_analysis"]["cluster_count"]} spending clusters found
+Hash Table: {algorithm_results["hash_table"]["date_groups"]} date-based transaction groups
+Sliding Window: {algorithm_results["sliding_window"]['trend']} trend with slope {algorithm_results["sliding_window"].get('avg_slope', 0):.3f}
+Heap Priority: {algorithm_results["heap_priority"]["priority_count"]} top priority debts identified
+Backtracking: {len(algorithm_results["backtracking"]["optimal_budget"] or [])} optimal budget allocations
+Divide Conquer: {algorithm_results["divide_conquer"]['count']} transactions processed
+Two Pointers: {algorithm_results["two_pointers"]["match_count"]} transaction pairs found
+
+CUSTOM CREDIT ANALYSIS:
+Credit Utilization: {utilization_ratio:.2%}
+Credit Score Code: {credit_score_code}
+Credit Health Status: {credit_score_descriptions.get(credit_score_code, "Unknown")}
+Total Transactions: {len(transaction_frame)}
+Card Age: {card_age_int} months
+
+RAW FINANCIAL DATA:
+Credit Card Limit: {financial_data.credit_card_limit}
+Card Age: {financial_data.card_age}
+Credit Forms: {financial_data.credit_forms}
+Current Debt: {financial_data.current_debt}
+Debt Amount: {financial_data.debt_amount}
+Debt End Date: {financial_data.debt_end_date}
+Debt Duration: {financial_data.debt_duration}
+"""
+    
+    custom_credit_score = {
+        "score_code": credit_score_code,
+        "utilization_ratio": utilization_ratio,
+        "credit_health_status": credit_score_descriptions.get(credit_score_code, "Unknown"),
+        "card_age_months": card_age_int,
+        "total_transactions": len(transaction_frame),
+        "algorithm_results": algorithm_results
+    }
+    
+    return insights_prompt, analysis_data, custom_credit_score
+
+async def generate_financial_insights(cleaned_data, financial_data, include_plan=True):
+    try:
+        insights_prompt, analysis_data, custom_credit_score = await run_in_threadpool(
+            compute_algorithm_results, cleaned_data, financial_data
+        )
+        
+        messages = [
+            {"role": "system", "content": insights_prompt},
+            {"role": "user", "content": f"Analyze this financial data with custom credit scoring: {analysis_data}"}
+        ]
+        
+        martian_client = get_martian_client()
+        response = await martian_client.chat_completions(
+            model="openai/gpt-4.1-nano:cheap",
+            messages=messages,
+            temperature=0.1
+        )
+        
+        insights_analysis = response.get("choices", [{}])[0].get("message", {}).get("content", "")
+        
+        import json
+        insights_json = json.loads(insights_analysis)
+        
+        # Add custom credit scoring data to the response
+        insights_json["custom_credit_score"] = custom_credit_score
+        
+        # Generate comprehensive credit improvement plan
+        plan_data = {}
+        if include_plan:
+            plan_data = await generate_credit_improvement_plan(
+                json.dumps(insights_json.get("financial_metrics", {})),
+                json.dumps(insights_json.get("insights", [])),
+                json.dumps(insights_json.get("recommendations", [])),
+                json.dumps(insights_json.get("risk_assessment", {})),
+                json.dumps(insights_json.get("trends", {})),
+                json.dumps(insights_json.get("custom_credit_score", {}))
+            )
+        
+        return {
+            "financial_metrics": json.dumps(insights_json.get("financial_metrics", {})),
+            "insights": json.dumps(insights_json.get("insights", [])),
+            "recommendations": json.dumps(insights_json.get("recommendations", [])),
+            "risk_assessment": json.dumps(insights_json.get("risk_assessment", {})),
+            "trends": json.dumps(insights_json.get("trends", {})),
+            "custom_credit_score": json.dumps(insights_json.get("custom_credit_score", {})),
+            "credit_improvement_plan": plan_data.get("credit_improvement_plan", "{}"),
+            "ai_insights_text": insights_json.get("ai_insights_text", ""),
+            "full_analysis": insights_analysis,
+            "insights_generated": True
+        }
+        
+    except Exception as e:
+        print(f"Error generating insights: {e}")
+        return {
+            "financial_metrics": "{}",
+            "insights": "[]",
+            "recommendations": "[]",
+            "risk_assessment": "{}",
+            "trends": "{}",
+            "custom_credit_score": "{}",
+            "credit_improvement_plan": "{}",
+            "ai_insights_text": f"Error generating insights: {str(e)}",
+            "full_analysis": f"Error: {str(e)}",
+            "insights_generated": False,
+            "error": str(e)
+        }
+
+# Stream the cleaning response, so a long reply for a big statement is read as it arrives
+# rather than hitting the read timeout while the model is still writing it. A completed
+# stream is stored in the Martian response cache like a non-streaming call.
+STREAM_CLEANING = os.getenv("STREAM_CLEANING", "true").lower() == "true"
+
+async def run_cleaning_prompt(messages, bypass_cache=False):
+    """Send the ai.prompt cleaning request and return the raw response text."""
+    martian_client = get_martian_client()
+    if not STREAM_CLEANING:
+        response = await martian_client.chat_completions(
+            model="openai/gpt-4.1-nano:cheap",
+            messages=messages,
+            temperature=0.1,
+            bypass_cache=bypass_cache
+        )
+        return response.get("choices", [{}])[0].get("message", {}).get("content", "")
+    
+    parts = []
+    async for event in martian_client.stream_chat_completions(
+        model="openai/gpt-4.1-nano:cheap",
+        messages=messages,
+        temperature=0.1,
+        bypass_cache=bypass_cache
+    ):
+        parts.append((event.get("choices") or [{}])[0].get("delta", {}).get("content") or "")
+    return "".join(parts)
+
+# Long statements are cleaned as concurrent chunks of at most this many tokens (~4 chars each)
+# so wall-clock time follows the slowest chunk instead of the statement length. 0 disables.
+CLEANING_CHUNK_TOKENS = int(os.getenv("CLEANING_CHUNK_TOKENS", "6000"))
+CHARS_PER_TOKEN = 4
+
+def split_statement_text(text, max_chars):
+    """
+    Pack the statement into chunks under `max_chars`, breaking between sections (blank
+    lines) where possible, then between lines, and only mid-line for a single huge line.
+    """
+    pieces = []
+    for section in re.split(r"\n\s*\n", text):
+        if len(section) <= max_chars:
+            pieces.append(section)
+            continue
+        for line in section.split("\n"):
+            pieces.extend(line[i:i + max_chars] for i in range(0, max(len(line), 1), max_chars))
+    
+    chunks, current = [], ""
+    for piece in pieces:
+        if current and len(current) + 1 + len(piece) > max_chars:
+            chunks.append(current)
+            current = piece
+        else:
+            current = f"{current}\n{piece}" if current else piece
+    if current.strip():
+        chunks.append(current)
+    return chunks
+
+def merge_purchases(chunk_purchases):
+    """
+    Concatenate per-chunk purchases in statement order. A purchase repeated in several
+    chunks (e.g. a summary table echoing earlier rows) is kept as many times as the chunk
+    listing it most often, so genuine same-day duplicates within one chunk survive.
+    """
+    kept = {}
+    merged = []
+    for purchases in chunk_purchases:
+        counts = {}
+        for purchase in purchases:
+            key = json.dumps(purchase, sort_keys=True)
+            counts[key] = counts.get(key, 0) + 1
+            if counts[key] > kept.get(key, 0):
+                kept[key] = counts[key]
+                merged.append(purchase)
+    return merged
+
+async def clean_chunk(financial_data, chunk):
+    """
+    The cleaned document for one chunk of statement text. A reply that isn't JSON is
+    retried once, bypassing the response cache; None if the retry isn't JSON either.
+    """
+    for attempt in range(2):
+        analysis = await run_cleaning_prompt(cleaning_messages(financial_data, chunk), bypass_cache=attempt > 0)
+        try:
+            return json.loads(analysis)
+        except json.JSONDecodeError:
+            print(f"Cleaning chunk returned invalid JSON (attempt {attempt + 1})")
+    return None
+
+async def run_cleaning(financial_data, pdf_text):
+    """
+    run_cleaning_prompt for the whole statement, or map-reduce over chunks when it is long.
+    If a chunk still isn't JSON after its retry, the statement is cleaned in one call instead
+    so no purchases are silently lost.
+    """
+    max_chars = CLEANING_CHUNK_TOKENS * CHARS_PER_TOKEN
+    if max_chars <= 0 or len(pdf_text or "") <= max_chars:
+        return await run_cleaning_prompt(cleaning_messages(financial_data, pdf_text))
+    
+    chunks = split_statement_text(pdf_text, max_chars)
+    
+    async def form_only():
+        analysis = await parse_locally(financial_data, "")
+        if analysis is not None:
+            return json.loads(analysis)
+        return await clean_chunk(financial_data, "")
+    
+    results = await asyncio.gather(form_only(), *(clean_chunk(financial_data, chunk) for chunk in chunks))
+    if any(data is None for data in results):
+        print(f"Chunked cleaning failed for {sum(data is None for data in results)} chunks, cleaning the whole statement")
+        return await run_cleaning_prompt(cleaning_messages(financial_data, pdf_text))
+    cleaned_data, chunk_data = results[0], results[1:]
+    # Card details normally come from the form; fall back to whatever a chunk found
+    for field in ("card_limit", "card_age"):
+        if not cleaned_data.get(field):
+            cleaned_data[field] = next((data[field] for data in chunk_data if data.get(field)), "")
+    cleaned_data["purchases"] = merge_purchases(data.get("purchases", []) for data in chunk_data)
+    return json.dumps(cleaned_data)
+
+# Statement analysis stages, run in order by the job queue. Each stage persists its output
+# so a job interrupted by a crash resumes from the first stage it had not finished.
+# `context` carries in-memory hand-offs (e.g. an unchanged analysis) within a single run.
+# Session work goes through run_in_threadpool so the workers never block the event loop.
+
+class StageError(Exception):
+    """Raised by a stage whose LLM call failed, so the job is reported as failed."""
+
+def load_job_data(db, job):
+    """The job's FinancialData with every column loaded, so stages can read it on the event loop."""
+    return db.get(models.FinancialData, job.financial_data_id, options=[undefer_group("ai_raw")])
+
+# Form fields sent to the cleaning prompt alongside the statement text
+FORM_FIELDS = (
+    "credit_card_limit",
+    "card_age",
+    "credit_forms",
+    "current_debt",
+    "debt_amount",
+    "debt_end_date",
+    "debt_duration",
+)
+
+async def extract_statement_text(source, digest=None):
+    """`source` is PDF bytes or a file path such as a blob store file; `digest` is its sha256 when already known."""
+    cache = get_statement_cache()
+    if cache is None:
+        return await run_in_threadpool(extract_pdf_text, source)
+    key = ResponseCache.make_key({"kind": "pdf_text", "sha256": digest or statement_digest(source)})
+    cached = await run_in_threadpool(cache.get, key)
+    if cached is not None:
+        return cached["text"]
+    text = await run_in_threadpool(extract_pdf_text, source)
+    await run_in_threadpool(cache.set, key, {"text": text})
+    return text
+
+async def extract_stage(db, job, context):
+    financial_data = await run_in_threadpool(load_job_data, db, job)
+    pdf_text = ""
+    if job.include_statement and financial_data.statement_digest:
+        digest = financial_data.statement_digest
+        pdf_text = await extract_statement_text(get_blob_store().path(digest), digest)
+    job.pdf_text = pdf_text
+
+def cleaning_messages(financial_data, pdf_text):
+    with open("ai.prompt", "r") as f:
+        prompt = f.read()
+    
+    user_data = f"""
+Credit Card Limit: {financial_data.credit_card_limit}
+Card Age: {financial_data.card_age}
+Credit Forms: {financial_data.credit_forms}
+Current Debt: {financial_data.current_debt}
+Debt Amount: {financial_data.debt_amount}
+Debt End Date: {financial_data.debt_end_date}
+Debt Duration: {financial_data.debt_duration}
+PDF Statement Text: {pdf_text or ""}
+"""
+    
+    return [
+        {"role": "system", "content": prompt},
+        {"role": "user", "content": f"text: {user_data}"}
+    ]
+
+# Known statement layouts are parsed locally; the cleaning prompt is only the fallback.
+STATEMENT_PARSER = os.getenv("STATEMENT_PARSER", "true").lower() == "true"
+STATEMENT_PARSER_MIN_CONFIDENCE = float(os.getenv("STATEMENT_PARSER_MIN_CONFIDENCE", "0.95"))
+_parser_stats = {"parsed": 0, "llm_fallback": 0}
+
+def statement_parser_stats():
+    return dict(_parser_stats, enabled=STATEMENT_PARSER, min_confidence=STATEMENT_PARSER_MIN_CONFIDENCE)
+
+async def parse_locally(financial_data, pdf_text):
+    """Returns the cleaned JSON text if the rule-based parser is confident enough, else None."""
+    if not STATEMENT_PARSER:
+        return None
+    form = {field: getattr(financial_data, field) for field in FORM_FIELDS}
+    result = await run_in_threadpool(parse_statement, pdf_text or "", form)
+    if result.confidence < STATEMENT_PARSER_MIN_CONFIDENCE:
+        _parser_stats["llm_fallback"] += 1
+        return None
+    _parser_stats["parsed"] += 1
+    return json.dumps(result.document)
+
+async def clean_statement(financial_data, pdf_text, pdf_digest=None):
+    """
+    Clean a statement with the local parser when it recognises the layout, otherwise run
+    the cleaning prompt, reusing the cached result for a byte-identical statement.
+    The cache key covers the statement hash and the ai.prompt text, so editing the prompt
+    invalidates earlier entries. If only the form fields changed, the cached purchases are
+    kept and the prompt is re-run on the form alone, which is a much smaller request.
+    Returns the response text, like run_cleaning_prompt.
+    """
+    parsed = await parse_locally(financial_data, pdf_text)
+    if parsed is not None:
+        return parsed
+    
+    messages = cleaning_messages(financial_data, pdf_text)
+    cache = get_statement_cache()
+    if cache is None or not pdf_digest:
+        return await run_cleaning(financial_data, pdf_text)
+    
+    key = ResponseCache.make_key({
+        "kind": "cleaned",
+        "sha256": pdf_digest,
+        "prompt": hashlib.sha256(messages[0]["content"].encode("utf-8")).hexdigest()
+    })
+    form = {field: getattr(financial_data, field) for field in FORM_FIELDS}
+    cached = await run_in_threadpool(cache.get, key)
+    if cached is not None and cached["form"] == form:
+        return cached["analysis"]
+    
+    if cached is not None:
+        form_analysis = await parse_locally(financial_data, "")
+        if form_analysis is None:
+            form_analysis = await run_cleaning_prompt(cleaning_messages(financial_data, ""))
+        cleaned_data = json.loads(form_analysis)
+        cleaned_data["purchases"] = json.loads(cached["analysis"]).get("purchases", [])
+        ai_analysis = json.dumps(cleaned_data)
+    else:
+        ai_analysis = await run_cleaning(financial_data, pdf_text)
+        try:
+            json.loads(ai_analysis)
+        except json.JSONDecodeError:
+            return ai_analysis
+    
+    await run_in_threadpool(cache.set, key, {"form": form, "analysis": ai_analysis})
+    return ai_analysis
+
+def apply_cleaned_data(financial_data, ai_analysis):
+    financial_data.ai_analysis_result = ai_analysis
+    cleaned_data = json.loads(ai_analysis)
+    
+    financial_data.cleaned_card_limit = cleaned_data.get("card_limit", "")
+    financial_data.cleaned_card_age = cleaned_data.get("card_age", "")
+    financial_data.cleaned_transaction_list = json.dumps(cleaned_data.get("purchases", []))
+    financial_data.cleaned_debt_history = json.dumps(cleaned_data.get("debt_history", []))
+    financial_data.is_data_cleaned = True
+    return cleaned_data
+
+def apply_insights(financial_data, insights_data):
+    financial_data.financial_metrics = insights_data.get("financial_metrics", "")
+    financial_data.insights = insights_data.get("insights", "")
+    financial_data.recommendations = insights_data.get("recommendations", "")
+    financial_data.risk_assessment = insights_data.get("risk_assessment", "")
+    financial_data.trends = insights_data.get("trends", "")
+    financial_data.custom_credit_score = insights_data.get("custom_credit_score", "")
+    financial_data.ai_insights_text = insights_data.get("ai_insights_text", "")
+    financial_data.ai_insights_result = insights_data.get("full_analysis", "")
+    # An error placeholder is shown but not treated as an analysis, so the next submission retries it
+    financial_data.is_insights_generated = bool(insights_data.get("insights_generated"))
+
+def save_cleaned_data(db, job, financial_data, cleaned_data):
+    try:
+        transactions.replace_transactions(db, [(job.user_id, financial_data.id, cleaned_data.get("purchases", []))])
+    except (ValueError, TypeError) as e:
+        print(f"Error writing transactions: {e}")
+    dashboard.refresh_dashboard(db, job.user_id, financial_data)
+
+async def clean_stage(db, job, context):
+    financial_data = await run_in_threadpool(load_job_data, db, job)
+    pdf_digest = financial_data.statement_digest if job.include_statement else None
+    ai_analysis = await clean_statement(financial_data, job.pdf_text, pdf_digest)
+    cleaned_data = apply_cleaned_data(financial_data, ai_analysis)
+    await run_in_threadpool(save_cleaned_data, db, job, financial_data, cleaned_data)
+
+async def update_analysis_state(db, job, financial_data, cleaned_data):
+    """Fold the cleaned purchases into the user's AnalysisState; returns it, or None if that failed."""
+    state = await run_in_threadpool(incremental.get_state, db, job.user_id)
+    form = {field: getattr(financial_data, field) for field in FORM_FIELDS}
+    try:
+        await run_in_threadpool(incremental.update_state, db, state, cleaned_data, form)
+    except Exception as e:
+        print(f"Error updating analysis state: {e}")
+        return None
+    return state
+
+async def insights_stage(db, job, context):
+    financial_data = await run_in_threadpool(load_job_data, db, job)
+    cleaned_data = json.loads(financial_data.ai_analysis_result)
+    if incremental.INCREMENTAL_ANALYSIS:
+        state = await update_analysis_state(db, job, financial_data, cleaned_data)
+        if state is not None and not incremental.needs_reanalysis(state, financial_data):
+            # The LLM output still stands, but the local scoring is redone for the new purchases
+            _, _, custom_credit_score = await run_in_threadpool(
+                compute_algorithm_results, cleaned_data, financial_data
+            )
+            financial_data.custom_credit_score = json.dumps(custom_credit_score)
+            await run_in_threadpool(dashboard.refresh_dashboard, db, job.user_id, financial_data)
+            # The plan stage reads this to skip its call too; a resumed job just regenerates the plan
+            context["analysis_unchanged"] = True
+            return
+    insights_data = await generate_financial_insights(
+        cleaned_data, financial_data, include_plan=False
+    )
+    if not insights_data.get("insights_generated"):
+        # The job fails and the previous insights stay on the dashboard
+        raise StageError(f"Insights generation failed: {insights_data.get('error')}")
+    apply_insights(financial_data, insights_data)
+    await run_in_threadpool(dashboard.refresh_dashboard, db, job.user_id, financial_data)
+
+def mark_plan_analyzed(db, user_id):
+    state = db.query(models.AnalysisState).filter(models.AnalysisState.user_id == user_id).first()
+    if state is not None:
+        incremental.mark_analyzed(state)
+
+async def plan_stage(db, job, context):
+    if context.get("analysis_unchanged"):
+        return
+    financial_data = await run_in_threadpool(load_job_data, db, job)
+    plan_data = await generate_credit_improvement_plan(
+        financial_data.financial_metrics or "{}",
+        financial_data.insights or "[]",
+        financial_data.recommendations or "[]",
+        financial_data.risk_assessment or "{}",
+        financial_data.trends or "{}",
+        financial_data.custom_credit_score or "{}"
+    )
+    if not plan_data.get("plan_generated"):
+        # /get-financial-data generates the plan on demand if it is still missing
+        raise StageError(f"Credit plan generation failed: {plan_data.get('error')}")
+    financial_data.credit_improvement_plan = plan_data["credit_improvement_plan"]
+    financial_data.is_plan_generated = True
+    await run_in_threadpool(dashboard.refresh_dashboard, db, job.user_id, financial_data)
+    # Only a complete analysis becomes the baseline that lets later submissions skip the calls
+    if incremental.INCREMENTAL_ANALYSIS and financial_data.is_insights_generated:
+        await run_in_threadpool(mark_plan_analyzed, db, job.user_id)
+
+ANALYSIS_STAGES = [
+    ("extract", extract_stage),
+    ("clean", clean_stage),
+    ("insights", insights_stage),
+    ("plan", plan_stage),
+]
+
+# On-demand plans for /get-financial-data, at most one in flight per user. Requests that
+# arrive while it runs wait on the same task instead of starting their own LLM call.
+_plan_generations = {}
+_plan_generation_stats = {"started": 0, "coalesced": 0, "failed": 0}
+
+def plan_generation_stats():
+    return dict(_plan_generation_stats, in_flight=len(_plan_generations))
+
+def store_generated_plan(db, user_id, financial_data, plan_data):
+    """
+    Write a freshly generated plan unless the row got one while the LLM call was running
+    (the analysis job's plan stage), then refresh the dashboard document either way.
+    """
+    db.refresh(financial_data, ["credit_improvement_plan", "is_plan_generated"])
+    if plan_data.get("plan_generated") and not dashboard.plan_ready(financial_data.credit_improvement_plan):
+        financial_data.credit_improvement_plan = plan_data["credit_improvement_plan"]
+        financial_data.is_plan_generated = True
+    dashboard.refresh_dashboard(db, user_id, financial_data)
+    db.commit()
+
+async def generate_plan_for_user(user_id):
+    """Generate and store the user's plan in a session of its own, so it outlives the request that started it."""
+    db = database.SessionLocal()
+    try:
+        financial_data = await run_in_threadpool(dashboard.load_financial_dashboard, db, user_id)
+        if financial_data is None:
+            return
+        plan_data = {}
+        if not dashboard.plan_ready(financial_data.credit_improvement_plan):
+            print("⚠️ No credit plan found, generating one now...")
+            plan_data = await generate_credit_improvement_plan(
+                financial_data.financial_metrics or "{}",
+                financial_data.insights or "[]",
+                financial_data.recommendations or "[]",
+                financial_data.risk_assessment or "{}",
+                financial_data.trends or "{}",
+                financial_data.custom_credit_score or "{}"
+            )
+            # A failed generation stores nothing, so the next dashboard load tries again
+            if plan_data.get("plan_generated"):
+                print("✅ Credit plan generated")
+            else:
+                print(f"❌ Credit plan generation failed: {plan_data.get('error')}")
+        # Also picks up a plan the analysis job stored while this request was waiting
+        await run_in_threadpool(store_generated_plan, db, user_id, financial_data, plan_data)
+    except Exception:
+        await run_in_threadpool(db.rollback)
+        raise
+    finally:
+        await run_in_threadpool(db.close)
+
+def _plan_generation_done(user_id, task):
+    if _plan_generations.get(user_id) is task:
+        del _plan_generations[user_id]
+    # Retrieved here so a generation nobody waited on still gets logged
+    if not task.cancelled() and task.exception() is not None:
+        _plan_generation_stats["failed"] += 1
+        print(f"❌ Failed to generate plan on fly: {task.exception()!r}")
+
+def ensure_plan(user_id):
+    """The user's in-flight plan generation, starting one if none is running."""
+    task = _plan_generations.get(user_id)
+    if task is not None:
+        _plan_generation_stats["coalesced"] += 1
+        return task
+    task = asyncio.create_task(generate_plan_for_user(user_id))
+    _plan_generations[user_id] = task
+    _plan_generation_stats["started"] += 1
+    task.add_done_callback(lambda done: _plan_generation_done(user_id, done))
+    return task
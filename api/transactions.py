@@ -0,0 +1,119 @@
+import os
+import sys
+from datetime import date
+from sqlalchemy import delete, insert, func, case
+import models
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dataInput import TransactionFrame
+
+# The cleaned purchases, one row each in the transactions table, so totals and date ranges
+# are answered by the database from the (user_id, purchase_date) and (user_id, unpaid)
+# indexes instead of by loading and parsing cleaned_transaction_list.
+
+
+def _to_date(year, month, day):
+    # Cleaned data can hold impossible dates and unpaid purchases use -1 placeholders
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+def transaction_rows(user_id, financial_data_id, purchases):
+    frame = TransactionFrame.fromPurchases(purchases)
+    columns = zip(
+        frame.purchaseYear.tolist(), frame.purchaseMonth.tolist(), frame.purchaseDay.tolist(),
+        frame.paymentYear.tolist(), frame.paymentMonth.tolist(), frame.paymentDay.tolist(),
+        frame.costCents.tolist(), frame.unpaid.tolist()
+    )
+    return [
+        {
+            "user_id": user_id,
+            "financial_data_id": financial_data_id,
+            "position": position,
+            "purchase_date": _to_date(py, pm, pd),
+            "payment_date": None if unpaid else _to_date(ay, am, ad),
+            "amount_cents": cents,
+            "unpaid": unpaid
+        }
+        for position, (py, pm, pd, ay, am, ad, cents, unpaid) in enumerate(columns)
+    ]
+
+
+def replace_transactions(db, entries):
+    """
+    Replace the stored transactions of every user in `entries`, an iterable of
+    (user_id, financial_data_id, purchases), with one DELETE and one executemany INSERT.
+    Rows are built before anything is deleted, so bad purchase data leaves the old rows.
+    The caller commits.
+    """
+    user_ids, rows = [], []
+    for user_id, financial_data_id, purchases in entries:
+        user_ids.append(user_id)
+        rows.extend(transaction_rows(user_id, financial_data_id, purchases))
+    if not user_ids:
+        return 0
+    db.execute(delete(models.Transaction).where(models.Transaction.user_id.in_(user_ids)))
+    if rows:
+        db.execute(insert(models.Transaction), rows)
+    return len(rows)
+
+
+def monthly_totals(db, user_id):
+    """Spending per calendar month, oldest first; purchases without a valid date are left out."""
+    year = func.extract("year", models.Transaction.purchase_date)
+    month = func.extract("month", models.Transaction.purchase_date)
+    rows = (
+        db.query(year, month, func.count(), func.sum(models.Transaction.amount_cents))
+        .filter(models.Transaction.user_id == user_id, models.Transaction.purchase_date.isnot(None))
+        .group_by(year, month)
+        .order_by(year, month)
+        .all()
+    )
+    return [
+        {"year": int(y), "month": int(m), "count": count, "total": int(total_cents) / 100}
+        for y, m, count, total_cents in rows
+    ]
+
+
+def unpaid_total(db, user_id):
+    total_cents = (
+        db.query(func.coalesce(func.sum(models.Transaction.amount_cents), 0))
+        .filter(models.Transaction.user_id == user_id, models.Transaction.unpaid.is_(True))
+        .scalar()
+    )
+    return int(total_cents) / 100
+
+
+def median_amount(db, user_id):
+    """The middle purchase amount (upper middle for an even count), or 0 without purchases."""
+    count = db.query(func.count()).filter(models.Transaction.user_id == user_id).scalar()
+    if not count:
+        return 0
+    cents = (
+        db.query(models.Transaction.amount_cents)
+        .filter(models.Transaction.user_id == user_id)
+        .order_by(models.Transaction.amount_cents)
+        .offset(count // 2)
+        .limit(1)
+        .scalar()
+    )
+    return int(cents) / 100
+
+
+def summary(db, user_id):
+    count, total_cents, unpaid_cents = (
+        db.query(
+            func.count(),
+            func.coalesce(func.sum(models.Transaction.amount_cents), 0),
+            func.coalesce(func.sum(case((models.Transaction.unpaid.is_(True), models.Transaction.amount_cents), else_=0)), 0)
+        )
+        .filter(models.Transaction.user_id == user_id)
+        .one()
+    )
+    return {
+        "transaction_count": count,
+        "total_spent": int(total_cents) / 100,
+        "unpaid_total": int(unpaid_cents) / 100,
+        "monthly_totals": monthly_totals(db, user_id)
+    }
@@ -37,6 +37,31 @@ export default function Form() {
     router.push("/");
   };
 
+  const waitForAnalysis = async (jobId: string, token: string) => {
+    // Analysis runs in the background; poll the job until it finishes
+    for (let attempt = 0; attempt < 150; attempt++) {
+      const response = await fetch(`http://52.90.72.192:8000/jobs/${jobId}`, {
+        headers: {
+          "Authorization": `Bearer ${token}`,
+        },
+      });
+      if (!response.ok) {
+        return;
+      }
+      const job = await response.json();
+      if (job.status === "succeeded") {
+        setMessage("✓ Analysis complete!");
+        return;
+      }
+      if (job.status === "failed") {
+        setMessage("Information saved, but the AI analysis failed");
+        return;
+      }
+      setMessage(`Analyzing your statement (${job.current_stage || "queued"})...`);
+      await new Promise(resolve => setTimeout(resolve, 2000));
+    }
+  };
+
   const handleSubmit = async (e: React.FormEvent) => {
     e.preventDefault();
     setIsSubmitting(true);
@@ -74,6 +99,9 @@ export default function Form() {
       if (response.ok) {
         const result = await response.json();
         setMessage(result.msg || "✓ Information submitted successfully!");
+        if (result.job_id) {
+          await waitForAnalysis(result.job_id, token);
+        }
         setTimeout(() => {
           router.push("/dashboard");
         }, 2000);
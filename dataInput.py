@@ -1,3 +1,4 @@
+import numpy as np
 
 class date:
     year = 0
@@ -28,6 +29,87 @@ class transactionData:
     
 
 
+class TransactionFrame:
+    #columnar transactions: one contiguous array per field instead of three objects per purchase
+    #dates stay as separate year/month/day columns because cleaned data can hold impossible dates
+    def __init__ (self, purchaseYear, purchaseMonth, purchaseDay, paymentYear, paymentMonth, paymentDay, costCents):
+        self.purchaseYear = np.ascontiguousarray(purchaseYear, dtype=np.int32)
+        self.purchaseMonth = np.ascontiguousarray(purchaseMonth, dtype=np.int32)
+        self.purchaseDay = np.ascontiguousarray(purchaseDay, dtype=np.int32)
+        self.paymentYear = np.ascontiguousarray(paymentYear, dtype=np.int32)
+        self.paymentMonth = np.ascontiguousarray(paymentMonth, dtype=np.int32)
+        self.paymentDay = np.ascontiguousarray(paymentDay, dtype=np.int32)
+        self.costCents = np.ascontiguousarray(costCents, dtype=np.int64)
+
+    @classmethod
+    def fromPurchases(cls, purchases):
+        #build straight from the cleaned "purchases" JSON, same defaults as the transactionData path
+        n = len(purchases)
+        dates = np.array([
+            (p.get("purchase_year", 0), p.get("purchase_month", 0), p.get("purchase_day", 0),
+             p.get("payment_year", -1), p.get("payment_month", -1), p.get("payment_day", -1))
+            for p in purchases
+        ], dtype=np.int32).reshape(n, 6)
+        costs = np.array([float(p.get("cost", "0.00")) for p in purchases], dtype=np.float64)
+        return cls(*dates.T, np.rint(costs * 100))
+
+    @classmethod
+    def fromTransactions(cls, transactionList):
+        n = len(transactionList)
+        dates = np.array([
+            (t.purchaseDate.year, t.purchaseDate.month, t.purchaseDate.day,
+             t.paymentDate.year, t.paymentDate.month, t.paymentDate.day)
+            for t in transactionList
+        ], dtype=np.int32).reshape(n, 6)
+        costs = np.array([t.cost for t in transactionList], dtype=np.float64)
+        return cls(*dates.T, np.rint(costs * 100))
+
+    def __len__(self):
+        return len(self.costCents)
+
+    def __getitem__(self, i):
+        #thin object view for code that still walks transactionData
+        return transactionData(
+            int(self.purchaseYear[i]), int(self.purchaseMonth[i]), int(self.purchaseDay[i]),
+            int(self.paymentYear[i]), int(self.paymentMonth[i]), int(self.paymentDay[i]),
+            int(self.costCents[i]) / 100)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def toTransactions(self):
+        return list(self)
+
+    @property
+    def cost(self):
+        return self.costCents / 100
+
+    @property
+    def unpaid(self):
+        return self.paymentYear < 0
+
+    def purchaseKey(self):
+        #yyyymmdd as one integer, orders the same way as comparing year, month then day
+        return self.purchaseYear.astype(np.int64) * 10000 + self.purchaseMonth * 100 + self.purchaseDay
+
+    def dateOrder(self):
+        #stable, so purchases on the same day keep their order like the bubble sort did
+        return np.argsort(self.purchaseKey(), kind="stable")
+
+    def take(self, indices):
+        return TransactionFrame(
+            self.purchaseYear[indices], self.purchaseMonth[indices], self.purchaseDay[indices],
+            self.paymentYear[indices], self.paymentMonth[indices], self.paymentDay[indices],
+            self.costCents[indices])
+
+    def sortByDate(self):
+        #in place, oldest to newest
+        order = self.dateOrder()
+        for name in ("purchaseYear", "purchaseMonth", "purchaseDay", "paymentYear", "paymentMonth", "paymentDay", "costCents"):
+            setattr(self, name, np.ascontiguousarray(getattr(self, name)[order]))
+
+
 class cardData:
     percentageUsed = 0.0
     def __init__(self, cardLimit, transactionList, ageOfCard):
@@ -40,6 +122,9 @@ class cardData:
         return self.ageOfCard
     def organizeDataSet(self, transactionList):
         #organize list oldest transactions to newest
+        if isinstance(transactionList, TransactionFrame):
+            transactionList.sortByDate()
+            return
         temp = 0
         changed = True
         while changed == True:
@@ -65,6 +150,10 @@ class cardData:
                             changed=True
     def percentageOfCardUsed(self, transactionList, cardLimit):
         #find percentage of card being used, calculate in terms of monthly usage based on 10 most recent months
+        if isinstance(transactionList, TransactionFrame):
+            if cardLimit > 0 and len(transactionList) > 0:
+                self.percentageUsed = int(transactionList.costCents[transactionList.unpaid].sum()) / 100 / cardLimit
+            return
         unpaidDebts = 0.0
         for i in range(len(transactionList)):
             if transactionList[i].paymentDate.year <0:
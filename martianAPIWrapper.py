@@ -1,13 +1,273 @@
 from __future__ import annotations
+import asyncio
+import random
+import socket
+import threading
 import time
 import json
-from typing import Any, Dict, Generator, Iterable, List, Optional, Union
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncGenerator, Dict, Generator, Iterable, List, Optional, Union
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from responseCache import ResponseCache
 
 
 class MartianAPIError(Exception):
     """Raised on non-2xx responses from Martian."""
 
+    def __init__(self, message: str, status_code: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class MartianCircuitOpenError(MartianAPIError):
+    """Raised without contacting Martian while the circuit breaker is open."""
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _error_from_response(status_code: int, reason: str, details: Any, headers: Any) -> MartianAPIError:
+    return MartianAPIError(
+        f"{status_code} {reason}: {details}",
+        status_code=status_code,
+        retry_after=_parse_retry_after(headers.get("Retry-After")),
+    )
+
+
+class _StreamAssembler:
+    """
+    Rebuilds the completion a stream delivered so it can be cached under the same key as
+    the equivalent non-streaming request, and replays a cached completion as one chunk.
+    """
+
+    def __init__(self) -> None:
+        self.parts: List[str] = []
+        self.finish_reason: Optional[str] = None
+        self.meta: Dict[str, Any] = {}
+        self.cacheable = True
+
+    def feed(self, event: Dict[str, Any]) -> None:
+        if "raw" in event:
+            self.cacheable = False
+            return
+        for key in ("id", "model", "created"):
+            if key in event:
+                self.meta.setdefault(key, event[key])
+        for choice in event.get("choices") or []:
+            delta = choice.get("delta") or {}
+            # Only single-choice text completions are reassembled
+            if choice.get("index", 0) != 0 or delta.get("tool_calls"):
+                self.cacheable = False
+            if delta.get("content"):
+                self.parts.append(delta["content"])
+            if choice.get("finish_reason"):
+                self.finish_reason = choice["finish_reason"]
+
+    def result(self) -> Dict[str, Any]:
+        return dict(self.meta, object="chat.completion", choices=[{
+            "index": 0,
+            "message": {"role": "assistant", "content": "".join(self.parts)},
+            "finish_reason": self.finish_reason,
+        }])
+
+    @staticmethod
+    def replay(result: Dict[str, Any]) -> Dict[str, Any]:
+        choice = (result.get("choices") or [{}])[0]
+        return {
+            "id": result.get("id"),
+            "model": result.get("model"),
+            "object": "chat.completion.chunk",
+            "choices": [{
+                "index": 0,
+                "delta": {"role": "assistant", "content": (choice.get("message") or {}).get("content", "")},
+                "finish_reason": choice.get("finish_reason"),
+            }],
+        }
+
+
+class RetryPolicy:
+    """
+    Retries for 429/5xx responses and transport errors with full-jitter exponential
+    backoff. A Retry-After header from the gateway takes precedence over the computed delay.
+    """
+
+    def __init__(
+        self,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 20.0,
+        retry_statuses: Iterable[int] = (429, 500, 502, 503, 504),
+    ):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_statuses = frozenset(retry_statuses)
+
+    def should_retry(self, attempt: int, status_code: Optional[int] = None) -> bool:
+        if attempt >= self.max_retries:
+            return False
+        return status_code is None or status_code in self.retry_statuses
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive gateway failures and rejects calls for
+    `reset_timeout` seconds, then lets a single probe through (half-open) to test recovery.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self.times_opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self._state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.times_opened += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+
+class LatencyTracker:
+    """Rolling window of recent call latencies used to pick the hedging delay."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+# The hedged attempt running on the current thread, if any
+_hedge_local = threading.local()
+
+
+class _HedgeAttempt:
+    """
+    One of the two requests of a hedge. The loser is cancelled by shutting down the socket
+    it is waiting on, so Martian sees the client go away and the thread is freed.
+    """
+
+    def __init__(self):
+        self.cancelled = False
+        self.connection = None
+        self._lock = threading.Lock()
+
+    def bind(self, connection) -> None:
+        with self._lock:
+            self.connection = connection
+            if self.cancelled:
+                self._abort()
+
+    def cancel(self) -> None:
+        with self._lock:
+            self.cancelled = True
+            self._abort()
+
+    def _abort(self) -> None:
+        sock = getattr(self.connection, "sock", None)
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+def _hedge_cancelled() -> bool:
+    attempt = getattr(_hedge_local, "attempt", None)
+    return attempt is not None and attempt.cancelled
+
+
+class _TrackedConnectionPool(HTTPConnectionPool):
+    def _get_conn(self, timeout=None):
+        conn = super()._get_conn(timeout)
+        attempt = getattr(_hedge_local, "attempt", None)
+        if attempt is not None:
+            attempt.bind(conn)
+        return conn
+
+
+class _TrackedHTTPSConnectionPool(_TrackedConnectionPool, HTTPSConnectionPool):
+    pass
+
+
+class _HedgingAdapter(HTTPAdapter):
+    """HTTPAdapter whose pools tell a hedged attempt which connection it is using, so it can be cancelled."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": _TrackedConnectionPool, "https": _TrackedHTTPSConnectionPool}
+
 
 class MartianClient:
     def __init__(
@@ -19,6 +279,12 @@ class MartianClient:
         org_id: Optional[str] = None,
         timeout: int = 60,
         session: Optional[requests.Session] = None,
+        pool_size: int = 10,
+        retry_policy: Optional[RetryPolicy] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        hedge: bool = False,
+        hedge_delay: Optional[float] = None,
+        cache: Optional[ResponseCache] = None,
     ):
         if not api_key:
             raise ValueError("api_key is required")
@@ -27,13 +293,100 @@ class MartianClient:
         self.openai_base = openai_base.rstrip("/")
         self.timeout = timeout
         self.org_id = org_id
-        self.http = session or requests.Session()
+        self.pool_size = pool_size
+        if session is None:
+            # requests keeps connections alive per pool; size the pool so concurrent
+            # callers sharing this client do not open and discard extra sockets.
+            session = requests.Session()
+            adapter = _HedgingAdapter(pool_connections=2, pool_maxsize=pool_size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        self.http = session
         self.http.headers.update(
             {
                 "Authorization": f"Bearer {self.api_key}",
                 "Content-Type": "application/json",
             }
         )
+        self._in_flight = 0
+        self._requests_sent = 0
+        self._stats_lock = threading.Lock()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.breaker = circuit_breaker or CircuitBreaker()
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self.latency = LatencyTracker()
+        self._retries = 0
+        self._hedges_fired = 0
+        self._hedge_wins = 0
+        self.cache = cache
+        self._hedge_pool: Optional[ThreadPoolExecutor] = None
+
+    def close(self) -> None:
+        if self._hedge_pool is not None:
+            self._hedge_pool.shutdown(wait=False)
+        self.http.close()
+
+    def preconnect(self, connections: int = 1) -> int:
+        """Open up to `connections` pooled sockets ahead of traffic. Returns how many succeeded."""
+        connections = max(1, min(connections, self.pool_size))
+        with ThreadPoolExecutor(max_workers=connections) as pool:
+            results = list(pool.map(lambda _: self._warm_one(), range(connections)))
+        return sum(results)
+
+    def _warm_one(self) -> bool:
+        try:
+            self.list_models()
+            return True
+        except Exception:
+            return False
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """Snapshot of the keep-alive pool: open, idle and in-use connections."""
+        open_conns = 0
+        idle_conns = 0
+        for adapter in self.http.adapters.values():
+            pools = getattr(getattr(adapter, "poolmanager", None), "pools", None)
+            if pools is None:
+                continue
+            for key in list(pools.keys()):
+                conn_pool = pools.get(key)
+                if conn_pool is None:
+                    continue
+                idle = sum(1 for conn in list(conn_pool.pool.queue) if conn is not None)
+                idle_conns += idle
+                open_conns += idle
+        with self._stats_lock:
+            in_use = self._in_flight
+            sent = self._requests_sent
+        return {
+            "pool_size": self.pool_size,
+            "open": open_conns + in_use,
+            "idle": idle_conns,
+            "in_use": in_use,
+            "requests_sent": sent,
+        }
+
+    def resilience_stats(self) -> Dict[str, Any]:
+        """Retry, hedging and circuit breaker counters."""
+        with self._stats_lock:
+            return {
+                "retries": self._retries,
+                "hedges_fired": self._hedges_fired,
+                "hedge_wins": self._hedge_wins,
+                "p95_latency": self.latency.percentile(0.95),
+                "breaker_state": self.breaker.state,
+                "breaker_opened": self.breaker.times_opened,
+                "breaker_rejected": self.breaker.rejected,
+            }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pool": self.pool_stats(),
+            "resilience": self.resilience_stats(),
+            "cache": self.cache.stats() if self.cache is not None else None,
+        }
+
     def _request(
         self,
         method: str,
@@ -43,23 +396,109 @@ class MartianClient:
         json_body: Optional[Dict[str, Any]] = None,
         stream: bool = False,
     ) -> requests.Response:
-        resp = self.http.request(
-            method=method,
-            url=url,
-            params=params,
-            json=json_body,
-            timeout=self.timeout,
-            stream=stream,
-        )
-        if not resp.ok:
-            details = None
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                raise MartianCircuitOpenError("Martian circuit breaker is open; failing fast")
+            with self._stats_lock:
+                self._in_flight += 1
+                self._requests_sent += 1
             try:
-                details = resp.json()
-            except Exception:
-                details = resp.text
-            raise MartianAPIError(f"{resp.status_code} {resp.reason}: {details}")
+                resp = self.http.request(
+                    method=method,
+                    url=url,
+                    params=params,
+                    json=json_body,
+                    timeout=self.timeout,
+                    stream=stream,
+                )
+            except requests.RequestException:
+                # A hedge loser we cut off ourselves says nothing about Martian's health
+                if _hedge_cancelled():
+                    raise
+                self.breaker.record_failure()
+                if not self.retry_policy.should_retry(attempt):
+                    raise
+                delay = self.retry_policy.delay(attempt)
+            else:
+                if resp.ok:
+                    self.breaker.record_success()
+                    return resp
+                if resp.status_code >= 500:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                details = None
+                try:
+                    details = resp.json()
+                except Exception:
+                    details = resp.text
+                resp.close()
+                error = _error_from_response(resp.status_code, resp.reason, details, resp.headers)
+                if not self.retry_policy.should_retry(attempt, resp.status_code):
+                    raise error
+                delay = self.retry_policy.delay(attempt, error.retry_after)
+            finally:
+                with self._stats_lock:
+                    self._in_flight -= 1
+            attempt += 1
+            with self._stats_lock:
+                self._retries += 1
+            time.sleep(delay)
+
+    def _hedged_attempt(self, attempt: _HedgeAttempt, url: str, payload: Dict[str, Any]) -> requests.Response:
+        _hedge_local.attempt = attempt
+        try:
+            resp = self._request("POST", url, json_body=payload)
+        finally:
+            _hedge_local.attempt = None
+        if attempt.cancelled:
+            resp.close()
         return resp
 
+    def _hedged_request(self, url: str, payload: Dict[str, Any]) -> requests.Response:
+        """
+        Send `payload` and, if no answer arrives within the hedge delay (p95 latency by
+        default), fire a duplicate and return whichever completes successfully first. The
+        other one is cancelled; on a caller-supplied session, which can't be told which
+        connection to abort, it runs to completion but its response is discarded.
+        """
+        delay = self.hedge_delay if self.hedge_delay is not None else self.latency.percentile(0.95)
+        if not self.hedge or delay is None:
+            return self._request("POST", url, json_body=payload)
+        if self._hedge_pool is None:
+            self._hedge_pool = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="martian-hedge")
+        attempts = {}
+        primary_attempt = _HedgeAttempt()
+        primary = self._hedge_pool.submit(self._hedged_attempt, primary_attempt, url, payload)
+        attempts[primary] = primary_attempt
+        try:
+            done, _ = wait([primary], timeout=delay)
+            if done:
+                return primary.result()
+            with self._stats_lock:
+                self._hedges_fired += 1
+            hedge_attempt = _HedgeAttempt()
+            hedge = self._hedge_pool.submit(self._hedged_attempt, hedge_attempt, url, payload)
+            attempts[hedge] = hedge_attempt
+            pending = {primary, hedge}
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        if future is hedge:
+                            with self._stats_lock:
+                                self._hedge_wins += 1
+                        return future.result()
+                    error = future.exception()
+            raise error
+        finally:
+            for future, attempt in attempts.items():
+                if not future.done():
+                    future.cancel()
+                    attempt.cancel()
+
     def chat_completions(
         self,
         *,
@@ -67,11 +506,14 @@ class MartianClient:
         messages: List[Dict[str, str]],
         max_tokens: Optional[int] = None,
         temperature: Optional[float] = None,
+        bypass_cache: bool = False,
         **kwargs: Any,
     ) -> Dict[str, Any]:
         """
         Create a chat completion. Set model='router' to enable auto model selection.
         Accepts any standard OpenAI Chat fields (tools, tool_choice, top_p, etc.).
+        When the client has a cache, identical requests are answered from it unless
+        bypass_cache=True, which forces a fresh call and refreshes the stored entry.
         """
         payload: Dict[str, Any] = {"model": model, "messages": messages}
         if max_tokens is not None:
@@ -81,8 +523,18 @@ class MartianClient:
         if kwargs:
             payload.update(kwargs)
         url = f"{self.openai_base}/chat/completions"
-        resp = self._request("POST", url, json_body=payload)
-        return resp.json()
+        cache_key = ResponseCache.make_key(payload) if self.cache is not None else None
+        if cache_key is not None and not bypass_cache:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+        started = time.monotonic()
+        resp = self._hedged_request(url, payload)
+        self.latency.record(time.monotonic() - started)
+        result = resp.json()
+        if cache_key is not None and result.get("choices"):
+            self.cache.set(cache_key, result)
+        return result
 
     def stream_chat_completions(
         self,
@@ -91,22 +543,33 @@ class MartianClient:
         messages: List[Dict[str, str]],
         max_tokens: Optional[int] = None,
         temperature: Optional[float] = None,
+        bypass_cache: bool = False,
         **kwargs: Any,
     ) -> Generator[Dict[str, Any], None, None]:
-        payload: Dict[str, Any] = {
-            "model": model,
-            "messages": messages,
-            "stream": True,
-        }
+        """
+        Stream a chat completion as parsed SSE chunks. With a cache, a stream that runs to
+        [DONE] is stored under the same key as the non-streaming request, and a cached
+        completion is replayed as a single chunk.
+        """
+        payload: Dict[str, Any] = {"model": model, "messages": messages}
         if max_tokens is not None:
             payload["max_tokens"] = max_tokens
         if temperature is not None:
             payload["temperature"] = temperature
         if kwargs:
             payload.update(kwargs)
+        cache_key = ResponseCache.make_key(payload) if self.cache is not None else None
+        if cache_key is not None and not bypass_cache:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                yield _StreamAssembler.replay(cached)
+                return
+        payload["stream"] = True
 
         url = f"{self.openai_base}/chat/completions"
         resp = self._request("POST", url, json_body=payload, stream=True)
+        assembler = _StreamAssembler()
+        completed = False
 
         for line in resp.iter_lines(decode_unicode=True):
             if not line:
@@ -114,11 +577,16 @@ class MartianClient:
             if line.startswith("data: "):
                 data = line[len("data: ") :].strip()
                 if data == "[DONE]":
+                    completed = True
                     break
                 try:
-                    yield json.loads(data)
+                    event = json.loads(data)
                 except json.JSONDecodeError:
-                    yield {"raw": data}
+                    event = {"raw": data}
+                assembler.feed(event)
+                yield event
+        if cache_key is not None and completed and assembler.cacheable:
+            self.cache.set(cache_key, assembler.result())
 
     def embeddings(
         self,
@@ -277,4 +745,461 @@ class MartianClient:
 
     def get_credit_balance(self) -> Dict[str, Any]:
         url = f"{self.gateway_base}/organization/credits"
-        return self._request("GET", url).json()
\ No newline at end of file
+        return self._request("GET", url).json()
+
+
+class AsyncMartianClient:
+    """
+    asyncio counterpart of MartianClient built on httpx. Exposes the same methods as
+    coroutines so request handlers can await LLM round trips without holding a thread.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        *,
+        gateway_base: str = "https://api.withmartian.com/v1",
+        openai_base: str = "https://api.withmartian.com/v1",
+        org_id: Optional[str] = None,
+        timeout: int = 60,
+        client: Optional[httpx.AsyncClient] = None,
+        pool_size: int = 100,
+        keepalive_expiry: float = 30.0,
+        retry_policy: Optional[RetryPolicy] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        hedge: bool = False,
+        hedge_delay: Optional[float] = None,
+        cache: Optional[ResponseCache] = None,
+    ):
+        if not api_key:
+            raise ValueError("api_key is required")
+        self.api_key = api_key
+        self.gateway_base = gateway_base.rstrip("/")
+        self.openai_base = openai_base.rstrip("/")
+        self.timeout = timeout
+        self.org_id = org_id
+        self.pool_size = pool_size
+        self.keepalive_expiry = keepalive_expiry
+        self.http = client or httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=pool_size,
+                keepalive_expiry=keepalive_expiry,
+            ),
+        )
+        self.http.headers.update(
+            {
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json",
+            }
+        )
+        self._in_flight = 0
+        self._requests_sent = 0
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.breaker = circuit_breaker or CircuitBreaker()
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self.latency = LatencyTracker()
+        self._retries = 0
+        self._hedges_fired = 0
+        self._hedge_wins = 0
+        self.cache = cache
+
+    async def aclose(self) -> None:
+        await self.http.aclose()
+
+    async def preconnect(self, connections: int = 1) -> int:
+        """Open up to `connections` pooled sockets ahead of traffic. Returns how many succeeded."""
+        connections = max(1, min(connections, self.pool_size))
+        results = await asyncio.gather(
+            *(self.list_models() for _ in range(connections)), return_exceptions=True
+        )
+        return sum(1 for r in results if not isinstance(r, BaseException))
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """Snapshot of the keep-alive pool: open, idle and in-use connections."""
+        # httpx does not surface its pool publicly; read the httpcore pool when present.
+        pool = getattr(getattr(self.http, "_transport", None), "_pool", None)
+        connections = list(getattr(pool, "connections", []) or [])
+        open_conns = [c for c in connections if not c.is_closed()]
+        idle_conns = [c for c in open_conns if c.is_idle()]
+        return {
+            "pool_size": self.pool_size,
+            "keepalive_expiry": self.keepalive_expiry,
+            "open": len(open_conns),
+            "idle": len(idle_conns),
+            "in_use": len(open_conns) - len(idle_conns),
+            "in_flight_requests": self._in_flight,
+            "requests_sent": self._requests_sent,
+        }
+
+    def resilience_stats(self) -> Dict[str, Any]:
+        """Retry, hedging and circuit breaker counters."""
+        return {
+            "retries": self._retries,
+            "hedges_fired": self._hedges_fired,
+            "hedge_wins": self._hedge_wins,
+            "p95_latency": self.latency.percentile(0.95),
+            "breaker_state": self.breaker.state,
+            "breaker_opened": self.breaker.times_opened,
+            "breaker_rejected": self.breaker.rejected,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pool": self.pool_stats(),
+            "resilience": self.resilience_stats(),
+            "cache": self.cache.stats() if self.cache is not None else None,
+        }
+
+    async def __aenter__(self) -> "AsyncMartianClient":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
+
+    async def _request(
+        self,
+        method: str,
+        url: str,
+        *,
+        params: Optional[Dict[str, Any]] = None,
+        json_body: Optional[Dict[str, Any]] = None,
+        stream: bool = False,
+    ) -> httpx.Response:
+        """Send with retries and the circuit breaker. Streamed responses must be closed by the caller."""
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                raise MartianCircuitOpenError("Martian circuit breaker is open; failing fast")
+            self._in_flight += 1
+            self._requests_sent += 1
+            try:
+                request = self.http.build_request(
+                    method,
+                    url,
+                    params=params,
+                    json=json_body,
+                    timeout=self.timeout,
+                )
+                resp = await self.http.send(request, stream=stream)
+            except httpx.TransportError:
+                self.breaker.record_failure()
+                if not self.retry_policy.should_retry(attempt):
+                    raise
+                delay = self.retry_policy.delay(attempt)
+            else:
+                if resp.is_success:
+                    self.breaker.record_success()
+                    return resp
+                if resp.status_code >= 500:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                await resp.aread()
+                await resp.aclose()
+                details = None
+                try:
+                    details = resp.json()
+                except Exception:
+                    details = resp.text
+                error = _error_from_response(resp.status_code, resp.reason_phrase, details, resp.headers)
+                if not self.retry_policy.should_retry(attempt, resp.status_code):
+                    raise error
+                delay = self.retry_policy.delay(attempt, error.retry_after)
+            finally:
+                self._in_flight -= 1
+            attempt += 1
+            self._retries += 1
+            await asyncio.sleep(delay)
+
+    async def _hedged_request(self, url: str, payload: Dict[str, Any]) -> httpx.Response:
+        """
+        Send `payload` and, if no answer arrives within the hedge delay (p95 latency by
+        default), fire a duplicate and return whichever completes successfully first.
+        """
+        delay = self.hedge_delay if self.hedge_delay is not None else self.latency.percentile(0.95)
+        if not self.hedge or delay is None:
+            return await self._request("POST", url, json_body=payload)
+        primary = asyncio.ensure_future(self._request("POST", url, json_body=payload))
+        hedge = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done:
+                return primary.result()
+            self._hedges_fired += 1
+            hedge = asyncio.ensure_future(self._request("POST", url, json_body=payload))
+            pending = {primary, hedge}
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self._hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    async def chat_completions(
+        self,
+        *,
+        model: Union[str, List[str]] = "router",
+        messages: List[Dict[str, str]],
+        max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None,
+        bypass_cache: bool = False,
+        **kwargs: Any,
+    ) -> Dict[str, Any]:
+        """
+        Create a chat completion. Set model='router' to enable auto model selection.
+        Accepts any standard OpenAI Chat fields (tools, tool_choice, top_p, etc.).
+        When the client has a cache, identical requests are answered from it unless
+        bypass_cache=True, which forces a fresh call and refreshes the stored entry.
+        """
+        payload: Dict[str, Any] = {"model": model, "messages": messages}
+        if max_tokens is not None:
+            payload["max_tokens"] = max_tokens
+        if temperature is not None:
+            payload["temperature"] = temperature
+        if kwargs:
+            payload.update(kwargs)
+        url = f"{self.openai_base}/chat/completions"
+        cache_key = ResponseCache.make_key(payload) if self.cache is not None else None
+        if cache_key is not None and not bypass_cache:
+            cached = await self._cache_call(self.cache.get, cache_key)
+            if cached is not None:
+                return cached
+        started = time.monotonic()
+        resp = await self._hedged_request(url, payload)
+        self.latency.record(time.monotonic() - started)
+        result = resp.json()
+        if cache_key is not None and result.get("choices"):
+            await self._cache_call(self.cache.set, cache_key, result)
+        return result
+
+    async def _cache_call(self, fn: Any, *args: Any) -> Any:
+        # The SQLite tier does blocking file I/O; keep it off the event loop.
+        if self.cache.has_disk_tier:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    async def stream_chat_completions(
+        self,
+        *,
+        model: Union[str, List[str]] = "router",
+        messages: List[Dict[str, str]],
+        max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None,
+        bypass_cache: bool = False,
+        **kwargs: Any,
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Stream a chat completion as parsed SSE chunks. With a cache, a stream that runs to
+        [DONE] is stored under the same key as the non-streaming request, and a cached
+        completion is replayed as a single chunk.
+        """
+        payload: Dict[str, Any] = {"model": model, "messages": messages}
+        if max_tokens is not None:
+            payload["max_tokens"] = max_tokens
+        if temperature is not None:
+            payload["temperature"] = temperature
+        if kwargs:
+            payload.update(kwargs)
+        cache_key = ResponseCache.make_key(payload) if self.cache is not None else None
+        if cache_key is not None and not bypass_cache:
+            cached = await self._cache_call(self.cache.get, cache_key)
+            if cached is not None:
+                yield _StreamAssembler.replay(cached)
+                return
+        payload["stream"] = True
+
+        url = f"{self.openai_base}/chat/completions"
+        resp = await self._request("POST", url, json_body=payload, stream=True)
+        assembler = _StreamAssembler()
+        completed = False
+        self._in_flight += 1
+        try:
+            async for line in resp.aiter_lines():
+                if not line:
+                    continue
+                if line.startswith("data: "):
+                    data = line[len("data: ") :].strip()
+                    if data == "[DONE]":
+                        completed = True
+                        break
+                    try:
+                        event = json.loads(data)
+                    except json.JSONDecodeError:
+                        event = {"raw": data}
+                    assembler.feed(event)
+                    yield event
+        finally:
+            self._in_flight -= 1
+            await resp.aclose()
+        if cache_key is not None and completed and assembler.cacheable:
+            await self._cache_call(self.cache.set, cache_key, assembler.result())
+
+    async def embeddings(
+        self,
+        *,
+        model: Union[str, List[str]] = "router",
+        input: Union[str, List[str]],
+        **kwargs: Any,
+    ) -> Dict[str, Any]:
+        payload: Dict[str, Any] = {"model": model, "input": input}
+        if kwargs:
+            payload.update(kwargs)
+        url = f"{self.openai_base}/embeddings"
+        resp = await self._request("POST", url, json_body=payload)
+        return resp.json()
+
+    async def list_models(self) -> Dict[str, Any]:
+        url = f"{self.openai_base}/models"
+        return (await self._request("GET", url)).json()
+
+    async def get_model(self, model: str) -> Dict[str, Any]:
+        url = f"{self.openai_base}/models/{model}"
+        return (await self._request("GET", url)).json()
+
+    async def create_router(self, router_id: str, base_model: str, description: Optional[str] = None) -> Dict[str, Any]:
+        url = f"{self.gateway_base}/routers"
+        body = {"router_id": router_id, "base_model": base_model}
+        if description:
+            body["description"] = description
+        return (await self._request("POST", url, json_body=body)).json()
+
+    async def update_router(self, router_id: str, router_spec: Dict[str, Any], description: Optional[str] = None) -> Dict[str, Any]:
+        url = f"{self.gateway_base}/routers/{router_id}"
+        body = {"router_spec": router_spec}
+        if description is not None:
+            body["description"] = description
+        return (await self._request("PATCH", url, json_body=body)).json()
+
+    async def list_routers(self) -> List[Dict[str, Any]]:
+        url = f"{self.gateway_base}/routers"
+        return (await self._request("GET", url)).json()
+
+    async def get_router(self, router_id: str, version: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        params = {"version": version} if version is not None else None
+        url = f"{self.gateway_base}/routers/{router_id}"
+        resp = await self._request("GET", url, params=params)
+        # May return 200 with null if not found depending on server; errors bubble otherwise
+        return resp.json()
+
+    async def run_router(
+        self,
+        router_id: str,
+        routing_constraint: Dict[str, Any],
+        completion_request: Dict[str, Any],
+        version: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        url = f"{self.gateway_base}/routers/{router_id}:run"
+        body = {
+            "routing_constraint": routing_constraint,
+            "completion_request": completion_request,
+        }
+        if version is not None:
+            body["version"] = version
+        return (await self._request("POST", url, json_body=body)).json()
+
+    async def run_router_training_job(
+        self,
+        *,
+        router_id: str,
+        judge_id: str,
+        llms: List[str],
+        requests_set: List[Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        url = f"{self.gateway_base}/router_training_jobs"
+        body = {
+            "router_id": router_id,
+            "judge_id": judge_id,
+            "llms": llms,
+            "requests": requests_set,
+        }
+        return (await self._request("POST", url, json_body=body)).json()
+
+    async def poll_training_job(self, job_name: str) -> Dict[str, Any]:
+        url = f"{self.gateway_base}/router_training_jobs/{job_name}"
+        return (await self._request("GET", url)).json()
+
+    async def wait_training_job(self, job_name: str, poll_interval: int = 10, poll_timeout: int = 1200) -> Dict[str, Any]:
+        start = time.time()
+        while True:
+            state = await self.poll_training_job(job_name)
+            status = (state or {}).get("status")
+            if status in {"SUCCESS", "FAILURE", "FAILURE_WITHOUT_RETRY"}:
+                return state
+            if time.time() - start > poll_timeout:
+                raise TimeoutError(f"Training job '{job_name}' did not complete in {poll_timeout}s")
+            await asyncio.sleep(poll_interval)
+
+    async def create_judge(self, judge_id: str, judge_spec: Dict[str, Any], description: Optional[str] = None) -> Dict[str, Any]:
+        url = f"{self.gateway_base}/judges"
+        body = {"judge_id": judge_id, "judge_spec": judge_spec}
+        if description:
+            body["description"] = description
+        return (await self._request("POST", url, json_body=body)).json()
+
+    async def update_judge(self, judge_id: str, judge_spec: Dict[str, Any]) -> Dict[str, Any]:
+        url = f"{self.gateway_base}/judges/{judge_id}"
+        body = {"judge_spec": judge_spec}
+        return (await self._request("PATCH", url, json_body=body)).json()
+
+    async def list_judges(self) -> List[Dict[str, Any]]:
+        url = f"{self.gateway_base}/judges"
+        return (await self._request("GET", url)).json()
+
+    async def get_judge(self, judge_id: str, version: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        params = {"version": version} if version is not None else None
+        url = f"{self.gateway_base}/judges/{judge_id}"
+        resp = await self._request("GET", url, params=params)
+        return resp.json()
+
+    async def get_judge_versions(self, judge_id: str) -> List[Dict[str, Any]]:
+        url = f"{self.gateway_base}/judges/{judge_id}/versions"
+        return (await self._request("GET", url)).json()
+
+    async def render_judge_prompt(
+        self,
+        judge_id: str,
+        completion_request: Dict[str, Any],
+        completion_response: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        url = f"{self.gateway_base}/judges/{judge_id}:render_prompt"
+        body = {"completion_request": completion_request, "completion_response": completion_response}
+        return (await self._request("POST", url, json_body=body)).json()
+
+    async def evaluate_with_judge(
+        self,
+        judge_id: str,
+        completion_request: Dict[str, Any],
+        completion_response: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        url = f"{self.gateway_base}/judges/{judge_id}:evaluate"
+        body = {"completion_request": completion_request, "completion_response": completion_response}
+        return (await self._request("POST", url, json_body=body)).json()
+
+    async def evaluate_with_spec(
+        self,
+        judge_spec: Dict[str, Any],
+        completion_request: Dict[str, Any],
+        completion_response: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        url = f"{self.gateway_base}/judge_specs:evaluate"
+        body = {
+            "judge_spec": judge_spec,
+            "completion_request": completion_request,
+            "completion_response": completion_response,
+        }
+        return (await self._request("POST", url, json_body=body)).json()
+
+    async def get_credit_balance(self) -> Dict[str, Any]:
+        url = f"{self.gateway_base}/organization/credits"
+        return (await self._request("GET", url)).json()
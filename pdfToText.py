@@ -1,12 +1,102 @@
 from PyPDF2 import PdfReader
 from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+import mmap
+import os
 
-def extract_pdf_text(pdf_bytes: bytes) -> str:
-    pdf_stream = BytesIO(pdf_bytes)
-    reader = PdfReader(pdf_stream)
-    text_content = []
-    for page in reader.pages:
-        page_text = page.extract_text()
-        if page_text:
-            text_content.append(page_text)
-    return "\n".join(text_content)
\ No newline at end of file
+MAX_PDF_BYTES = int(os.getenv("MAX_PDF_BYTES", str(25 * 1024 * 1024)))
+MAX_PDF_PAGES = int(os.getenv("MAX_PDF_PAGES", "500"))
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Below this many pages the cost of shipping the document to worker processes outweighs the speedup
+PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "16"))
+
+_pool = None
+
+
+class PdfTooLargeError(ValueError):
+    pass
+
+
+def _source_size(source) -> int:
+    if isinstance(source, (bytes, bytearray)):
+        return len(source)
+    return os.path.getsize(source)
+
+
+@contextmanager
+def _open_stream(source):
+    """A seekable stream over bytes, or a read-only memory map of a file path."""
+    if isinstance(source, (bytes, bytearray)):
+        yield BytesIO(source)
+        return
+    with open(source, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+        yield view
+
+
+def _open_reader(stream, size, max_pages=None, max_bytes=None) -> PdfReader:
+    """Open a stream from _open_stream, rejecting documents over the byte or page limit before any text is extracted."""
+    max_bytes = MAX_PDF_BYTES if max_bytes is None else max_bytes
+    max_pages = MAX_PDF_PAGES if max_pages is None else max_pages
+    if max_bytes and size > max_bytes:
+        raise PdfTooLargeError(f"PDF is {size} bytes, limit is {max_bytes}")
+    reader = PdfReader(stream)
+    if max_pages and len(reader.pages) > max_pages:
+        raise PdfTooLargeError(f"PDF has {len(reader.pages)} pages, limit is {max_pages}")
+    return reader
+
+
+def iter_pdf_pages(source, max_pages=None, max_bytes=None):
+    """Yield the text of each page in order as it is extracted ("" for pages without text)."""
+    size = _source_size(source)
+    with _open_stream(source) as stream:
+        reader = _open_reader(stream, size, max_pages, max_bytes)
+        for page in reader.pages:
+            yield page.extract_text() or ""
+
+
+def _extract_page_range(source, start: int, stop: int) -> list:
+    with _open_stream(source) as stream:
+        reader = PdfReader(stream)
+        return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS)
+    return _pool
+
+
+def shutdown_pdf_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def extract_pdf_text(pdf_bytes, max_pages=None, max_bytes=None, workers=None) -> str:
+    """
+    Extract the text of a PDF given as bytes or a file path; files are memory-mapped rather
+    than read into memory. Long documents are split into contiguous page ranges that are
+    extracted in a process pool; pages stay in order. Pass a path for those so workers map
+    the file themselves instead of receiving a copy of the bytes.
+    """
+    size = _source_size(pdf_bytes)
+    with _open_stream(pdf_bytes) as stream:
+        reader = _open_reader(stream, size, max_pages, max_bytes)
+        page_count = len(reader.pages)
+        workers = PDF_WORKERS if workers is None else workers
+
+        if workers <= 1 or page_count < PARALLEL_MIN_PAGES:
+            pages = [page.extract_text() or "" for page in reader.pages]
+        else:
+            step = -(-page_count // workers)
+            pool = _get_pool()
+            futures = [
+                pool.submit(_extract_page_range, pdf_bytes, start, min(start + step, page_count))
+                for start in range(0, page_count, step)
+            ]
+            pages = [text for future in futures for text in future.result()]
+
+    return "\n".join(text for text in pages if text)
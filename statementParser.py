@@ -0,0 +1,347 @@
+import re
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# Dollar amounts as printed on statements: 1,234.56 / $1,234.56 / -50.00 / (50.00) / 50.00 CR
+AMOUNT_PATTERN = r"\(?-?\$?-?[\d,]+\.\d{2}\)?(?:\s*CR)?"
+DEBT_TYPES = {
+    r"\bmortgage": "mortgage",
+    r"\bauto\b|\bcar loan|\bvehicle": "auto_loan",
+    r"\bstudent": "student_loan",
+    r"\bpersonal loan": "personal_loan",
+    r"line of credit|\bheloc\b": "line_of_credit",
+    r"credit card": "credit_card",
+}
+# Statement summary totals the parsed rows are reconciled against
+PURCHASES_TOTAL = rf"(?im)^\s*\+?\s*purchases(?: and adjustments)?\s*:?\s*\+?\s*(?P<amount>{AMOUNT_PATTERN})\s*$"
+CREDITS_TOTAL = rf"(?im)^\s*-?\s*payments(?:,? (?:and )?(?:other )?credits)?\s*:?\s*(?P<amount>{AMOUNT_PATTERN})\s*$"
+# Confidence factor when no printed total could be checked, or a total did not match
+UNRECONCILED = 0.5
+DATE_FORMATS = ("%Y-%m-%d", "%m/%d/%Y", "%m/%d/%y", "%B %d, %Y", "%b %d, %Y", "%B %d %Y", "%b %d %Y")
+MONTH_FORMATS = ("%B %Y", "%b %Y", "%Y-%m", "%m/%Y")
+
+
+class StatementLayout:
+    """
+    One issuer's transaction table. The layout applies when every `detect` pattern is found
+    in the statement text: the issuer's name or the table's exact column header, so that a
+    table with extra columns (e.g. a running balance) is never read as this one. Lines
+    matching `row_start` are candidate transaction rows and `transaction` must match the
+    whole line with named groups `date`, `description` and `amount`. If `date_format`
+    carries no year, it is taken from the statement closing date found by `closing_date`.
+    `purchases_total` and `credits_total` find the statement summary lines the parsed rows
+    are reconciled against.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        detect: Sequence[str],
+        row_start: str,
+        transaction: str,
+        date_format: str,
+        closing_date: Optional[str] = None,
+        closing_date_formats: Sequence[str] = DATE_FORMATS,
+        limit: Optional[str] = None,
+        payment: str = r"(?i)payment|thank you|autopay",
+        purchases_total: Optional[str] = PURCHASES_TOTAL,
+        credits_total: Optional[str] = CREDITS_TOTAL,
+    ):
+        self.name = name
+        self.detect = [re.compile(pattern) for pattern in detect]
+        self.row_start = re.compile(row_start)
+        self.transaction = re.compile(transaction)
+        self.date_format = date_format
+        self.closing_date = re.compile(closing_date) if closing_date else None
+        self.closing_date_formats = tuple(closing_date_formats)
+        self.limit = re.compile(limit) if limit else None
+        self.payment = re.compile(payment)
+        self.purchases_total = re.compile(purchases_total) if purchases_total else None
+        self.credits_total = re.compile(credits_total) if credits_total else None
+
+    def matches(self, text: str) -> bool:
+        return all(pattern.search(text) for pattern in self.detect)
+
+    @property
+    def needs_year(self) -> bool:
+        return "%Y" not in self.date_format and "%y" not in self.date_format
+
+
+class ParseResult:
+    def __init__(self, document: Dict[str, Any], confidence: float, layout: Optional[str]):
+        self.document = document
+        self.confidence = confidence
+        self.layout = layout
+
+
+# Transaction table headers: date column(s), description and a single amount column. A header
+# with any further column (balance, reward points, category) does not match.
+_TABLE_HEADER = (
+    r"(?im)^\s*(?:trans(?:action)?\.?\s+)?date\s+(?:post(?:ing)?\.?\s+date\s+)?"
+    r"(?:description|merchant name or transaction description|details)\s+amount(?:\s*\(\$\))?\s*$"
+)
+
+LAYOUTS: List[StatementLayout] = [
+    # MM/DD transaction date, optional MM/DD posting date, year from "Closing Date MM/DD/YY"
+    # (or the end of an "Opening/Closing Date MM/DD/YY - MM/DD/YY" period)
+    StatementLayout(
+        name="us_mmdd",
+        detect=[r"(?i)closing date", _TABLE_HEADER],
+        row_start=r"^\d{2}/\d{2}\s",
+        transaction=rf"^(?P<date>\d{{2}}/\d{{2}})\s+(?:\d{{2}}/\d{{2}}\s+)?(?P<description>.+?)\s+(?P<amount>{AMOUNT_PATTERN})$",
+        date_format="%m/%d",
+        closing_date=r"(?i)closing date\s*:?\s*(?:\d{2}/\d{2}/\d{2,4}\s*-\s*)?(?P<date>\d{2}/\d{2}/\d{2,4})",
+        limit=r"(?i)credit (?:access )?(?:line|limit)\s*:?\s*\$?(?P<limit>[\d,]+(?:\.\d{2})?)",
+    ),
+    # "Jan 15" transaction date, optional posting date, year from "Closing Date Jan 31, 2024"
+    StatementLayout(
+        name="month_day",
+        detect=[r"(?i)closing date", _TABLE_HEADER],
+        row_start=r"^[A-Z][a-z]{2} \d{1,2}\s",
+        transaction=rf"^(?P<date>[A-Z][a-z]{{2}} \d{{1,2}})\s+(?:[A-Z][a-z]{{2}} \d{{1,2}}\s+)?(?P<description>.+?)\s+(?P<amount>{AMOUNT_PATTERN})$",
+        date_format="%b %d",
+        closing_date=r"(?i)closing date\s*:?\s*(?P<date>[A-Z][a-z]{2} \d{1,2},? \d{4})",
+        limit=r"(?i)credit (?:line|limit)\s*:?\s*\$?(?P<limit>[\d,]+(?:\.\d{2})?)",
+    ),
+    # Full ISO dates on every row, no closing date needed
+    StatementLayout(
+        name="iso_date",
+        detect=[r"\d{4}-\d{2}-\d{2}", _TABLE_HEADER],
+        row_start=r"^\d{4}-\d{2}-\d{2}\s",
+        transaction=rf"^(?P<date>\d{{4}}-\d{{2}}-\d{{2}})\s+(?:\d{{4}}-\d{{2}}-\d{{2}}\s+)?(?P<description>.+?)\s+(?P<amount>{AMOUNT_PATTERN})$",
+        date_format="%Y-%m-%d",
+        limit=r"(?i)credit (?:line|limit)\s*:?\s*\$?(?P<limit>[\d,]+(?:\.\d{2})?)",
+    ),
+]
+
+
+def register_layout(layout: StatementLayout) -> None:
+    """Add an issuer layout; later registrations are tried first."""
+    LAYOUTS.insert(0, layout)
+
+
+def parse_amount_cents(text: str) -> Optional[int]:
+    """Signed cents from a statement amount; credits (minus, parentheses or CR) are negative."""
+    text = text.strip()
+    if not re.fullmatch(r"\(?-?\$?\s*-?[\d,]+(?:\.\d{1,2})?\)?(?:\s*CR)?", text, re.IGNORECASE):
+        return None
+    negative = text.startswith("(") or "-" in text or text.upper().endswith("CR")
+    whole, _, fraction = re.sub(r"[^\d.]", "", text).partition(".")
+    cents = int(whole) * 100 + int((fraction + "00")[:2])
+    return -cents if negative else cents
+
+
+def format_cents(cents: int) -> str:
+    return f"{cents // 100}.{cents % 100:02d}"
+
+
+def _parse_date(text: str, formats: Sequence[str]) -> Optional[date]:
+    for fmt in formats:
+        try:
+            return datetime.strptime(text.strip(), fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _parse_months(text: str) -> Optional[int]:
+    """
+    Months in a duration like "18", "1.5 years" or "2 years 6 months". A lone number counts as
+    months; several numbers are summed only when each has its own unit, otherwise the text is
+    ambiguous ("2-3 years", "2 6 months") and None is returned so the caller defers to the LLM.
+    """
+    pairs = re.findall(r"(\d+(?:\.\d+)?)\s*(years?|yrs?|months?|mos?)?", text or "", re.IGNORECASE)
+    if not pairs or (len(pairs) > 1 and not all(unit for _, unit in pairs)):
+        return None
+    value = sum(float(number) * (12 if unit.lower().startswith("y") else 1) for number, unit in pairs)
+    return int(round(value))
+
+
+def _normalize_form(form: Dict[str, Any]) -> Tuple[Dict[str, Any], float]:
+    """
+    Apply the ai.prompt formatting rules to the free-text form fields. Returns the partial
+    document and a confidence factor that drops when a field can't be normalized.
+    """
+    confidence = 1.0
+    document: Dict[str, Any] = {"card_limit": "", "card_age": "", "debt_history": []}
+
+    limit_text = str(form.get("credit_card_limit") or "").strip()
+    if limit_text:
+        cents = parse_amount_cents(limit_text)
+        if cents is None:
+            confidence *= 0.5
+        else:
+            document["card_limit"] = format_cents(abs(cents))
+
+    age_text = str(form.get("card_age") or "").strip()
+    if age_text:
+        months = _parse_months(age_text)
+        if months is None:
+            confidence *= 0.5
+        else:
+            document["card_age"] = str(months)
+
+    amount_text = str(form.get("debt_amount") or "").strip()
+    amount = parse_amount_cents(amount_text) if amount_text else None
+    if amount_text and amount is None:
+        confidence *= 0.5
+    if amount:
+        end_text = str(form.get("debt_end_date") or "").strip()
+        end_date = _parse_date(end_text, DATE_FORMATS) or _parse_date(end_text, MONTH_FORMATS)
+        duration = _parse_months(str(form.get("debt_duration") or ""))
+        if end_date is None or duration is None:
+            confidence *= 0.5
+        described = " ".join(str(form.get(field) or "") for field in ("current_debt", "credit_forms")).lower()
+        debt_types = {debt_type for pattern, debt_type in DEBT_TYPES.items() if re.search(pattern, described)}
+        if len(debt_types) != 1:
+            confidence *= 0.8
+        document["debt_history"].append({
+            "debt_type": debt_types.pop() if len(debt_types) == 1 else "other",
+            "amount": format_cents(abs(amount)),
+            "end_date": end_date.isoformat() if end_date else "",
+            "duration_months": duration or 0,
+        })
+    return document, confidence
+
+
+def _apply_payments(purchases: List[Dict[str, Any]], payments: List[tuple]) -> None:
+    """
+    Statements list payments, not which purchase each one settled. Payments are applied
+    oldest purchase first; a purchase is paid on the date of the payment that covers it in
+    full, and anything not fully covered stays unpaid (-1) as ai.prompt specifies.
+    """
+    order = sorted(range(len(purchases)), key=lambda i: purchases[i]["_date"])
+    next_unpaid = 0
+    for paid_on, cents in sorted(payments):
+        remaining = cents
+        while next_unpaid < len(order):
+            purchase = purchases[order[next_unpaid]]
+            if purchase["_date"] > paid_on or purchase["_cents"] > remaining:
+                break
+            remaining -= purchase["_cents"]
+            purchase.update(payment_year=paid_on.year, payment_month=paid_on.month, payment_day=paid_on.day)
+            next_unpaid += 1
+
+
+def _reconcile(layout: StatementLayout, text: str, purchase_cents: int, credit_cents: int) -> float:
+    """
+    How well the parsed rows account for the statement's printed purchase and credit
+    totals: 1.0 when every total found matches to the cent. A mismatch, or a statement with
+    no total to check, scales the coverage down by UNRECONCILED, so it falls back to the LLM.
+    """
+    checks = []
+    for pattern, parsed in ((layout.purchases_total, purchase_cents), (layout.credits_total, credit_cents)):
+        match = pattern.search(text) if pattern is not None else None
+        printed = parse_amount_cents(match.group("amount")) if match else None
+        if printed is not None:
+            checks.append((abs(printed), parsed))
+    if not checks:
+        return UNRECONCILED
+    coverage = 1.0
+    for printed, parsed in checks:
+        if printed != parsed:
+            coverage *= UNRECONCILED * (min(printed, parsed) / max(printed, parsed) if max(printed, parsed) else 0.0)
+    return coverage
+
+
+def _parse_with_layout(layout: StatementLayout, text: str) -> Tuple[Dict[str, Any], float]:
+    closing = None
+    if layout.closing_date is not None:
+        match = layout.closing_date.search(text)
+        if match:
+            closing = _parse_date(match.group("date"), layout.closing_date_formats)
+    if layout.needs_year and closing is None:
+        return {}, 0.0
+
+    candidates = 0
+    parsed_rows = 0
+    purchase_cents = credit_cents = 0
+    purchases: List[Dict[str, Any]] = []
+    payments = []
+    for raw_line in text.splitlines():
+        line = " ".join(raw_line.split())
+        if not layout.row_start.match(line):
+            continue
+        candidates += 1
+        match = layout.transaction.match(line)
+        if not match:
+            continue
+        cents = parse_amount_cents(match.group("amount"))
+        # A second amount before the last one means an extra column (e.g. a running balance),
+        # and which of them is the transaction amount can't be told from the line
+        if cents is None or re.search(rf"\s{AMOUNT_PATTERN}$", match.group("description")):
+            continue
+        try:
+            if layout.needs_year:
+                parsed = datetime.strptime(f"{match.group('date')} {closing.year}", f"{layout.date_format} %Y").date()
+                # Rows after the closing date belong to the previous year (December rows on a January statement)
+                if parsed > closing:
+                    parsed = parsed.replace(year=parsed.year - 1)
+            else:
+                parsed = datetime.strptime(match.group("date"), layout.date_format).date()
+        except ValueError:
+            continue
+        parsed_rows += 1
+        if cents < 0:
+            credit_cents += -cents
+            if layout.payment.search(match.group("description")):
+                payments.append((parsed, -cents))
+            continue
+        purchase_cents += cents
+        purchases.append({
+            "purchase_year": parsed.year,
+            "purchase_month": parsed.month,
+            "purchase_day": parsed.day,
+            "payment_year": -1,
+            "payment_month": -1,
+            "payment_day": -1,
+            "cost": format_cents(cents),
+            "_date": parsed,
+            "_cents": cents,
+        })
+
+    if candidates == 0:
+        return {}, 0.0
+    _apply_payments(purchases, payments)
+    for purchase in purchases:
+        del purchase["_date"], purchase["_cents"]
+
+    document: Dict[str, Any] = {"purchases": purchases}
+    if layout.limit is not None:
+        match = layout.limit.search(text)
+        if match:
+            limit = match.group("limit")
+            document["card_limit"] = format_cents(parse_amount_cents(limit))
+    return document, parsed_rows / candidates * _reconcile(layout, text, purchase_cents, credit_cents)
+
+
+def parse_statement(pdf_text: str, form: Dict[str, Any], layouts: Optional[Sequence[StatementLayout]] = None) -> ParseResult:
+    """
+    Build the ai.prompt JSON document (card_limit, card_age, purchases, debt_history) from
+    extracted statement text and the submitted form without calling the LLM. The confidence
+    is the share of candidate transaction rows the best matching layout parsed, times how
+    well those rows reconcile with the statement's printed purchase and credit totals, scaled
+    down for form fields that could not be normalized; callers fall back to the LLM below
+    their threshold. Refunds and other non-payment credits are not purchases and are dropped.
+    """
+    document, confidence = _normalize_form(form)
+    if not (pdf_text or "").strip():
+        document["purchases"] = []
+        return ParseResult(document, confidence, None)
+
+    best_layout, best_document, best_confidence = None, {}, 0.0
+    for layout in LAYOUTS if layouts is None else layouts:
+        if not layout.matches(pdf_text):
+            continue
+        parsed, row_confidence = _parse_with_layout(layout, pdf_text)
+        if row_confidence > best_confidence:
+            best_layout, best_document, best_confidence = layout.name, parsed, row_confidence
+
+    document["purchases"] = best_document.get("purchases", [])
+    if not document["card_limit"] and best_document.get("card_limit"):
+        document["card_limit"] = best_document["card_limit"]
+    return ParseResult(
+        {key: document[key] for key in ("card_limit", "card_age", "purchases", "debt_history")},
+        confidence * best_confidence,
+        best_layout,
+    )